@@ -1,63 +1,216 @@
 import logging
 import redis
-import pickle
 import os
+import time
 import pandas as pd
-from whoscored import get_matches_data, preprocess_events_df
-from helper import *
+import functools
+from whoscored import DriverManager, RawMatchCache, iter_season_matches, parse_raw_match, preprocess_match
+from helper import metrics, Pipeline, Stage, XTCorpus, clubs_list, clubs_ids
+from storage import RedisSink, AggregatesWriter, game_index_entries, deserialize_df
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
 
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 4))
+REDIS_BATCH_SIZE = int(os.getenv('REDIS_BATCH_SIZE', 50))
+REDIS_TTL = int(os.getenv('REDIS_TTL', 0)) or None  # seconds, no expiration by default
+SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', 1))
+HTTP_FETCH = os.getenv('HTTP_FETCH', 'false').lower() == 'true'
+RAW_CACHE_DIR = os.getenv('RAW_CACHE_DIR')  # raw match cache disabled if not set
+RAW_CACHE_MAX_MB = int(os.getenv('RAW_CACHE_MAX_MB', 2048))
+OFFLINE = os.getenv('OFFLINE', 'false').lower() == 'true'
+DRIVER_MAX_PAGES = int(os.getenv('DRIVER_MAX_PAGES', 200))  # pages loaded before a browser is recycled
+DRIVER_MAX_MEMORY_MB = int(os.getenv('DRIVER_MAX_MEMORY_MB', 1536))  # browser memory before it is recycled
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', 1))
+PARSE_EXECUTOR = os.getenv('PARSE_EXECUTOR', 'thread')  # thread or process
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', os.getenv('PREPROCESS_PROCESSES', os.cpu_count() or 1)))
+# A process per core, the thread executor avoids pickling the matches when there is a single one
+PREPROCESS_EXECUTOR = os.getenv('PREPROCESS_EXECUTOR', 'process' if PREPROCESS_WORKERS > 1 else 'thread')
+PREPROCESS_CHUNKSIZE = int(os.getenv('PREPROCESS_CHUNKSIZE', 4))  # matches sent to a preprocess worker at once
+STORE_WORKERS = int(os.getenv('STORE_WORKERS', 2))  # a single one when the pipeline is ordered
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 8))  # matches waiting between two stages
+PIPELINE_ORDERED = os.getenv('PIPELINE_ORDERED', 'true').lower() == 'true'  # matches stored in the scraping order
+XT_MODEL_PATH = os.getenv('XT_MODEL_PATH')  # fitted xT grid, the distance-based grid is used if not set
+XT_GRID_SHAPE = tuple(int(cells) for cells in os.getenv('XT_GRID_SHAPE', '16x12').split('x'))  # length x width cells
+INCREMENTAL = os.getenv('INCREMENTAL', 'true').lower() == 'true'
+REDIS_FORMAT = os.getenv('REDIS_FORMAT', 'arrow')  # arrow, parquet or pickle
+REDIS_COMPRESSION = os.getenv('REDIS_COMPRESSION', 'zstd')  # zstd, lz4 or none
+if REDIS_COMPRESSION == 'none':
+    REDIS_COMPRESSION = None
+# blob: one key per game, segments: one hash of column and event segments per game, both: the two
+REDIS_LAYOUT = os.getenv('REDIS_LAYOUT', 'both')
+METRICS_JSON_PATH = os.getenv('METRICS_JSON_PATH')  # JSON metrics report, not written if not set
+METRICS_PROM_PATH = os.getenv('METRICS_PROM_PATH')  # Prometheus textfile, not written if not set
 
-def store_df_in_redis(redis_client, key, df):
-    """Stores a DataFrame in Redis"""
+# Redis set of the ids of the finished games already stored
+PROCESSED_GAMES_KEY = "processed_games"
+
+def load_df_from_redis(redis_client, key):
+    """Loads a DataFrame from Redis, returns None if the key doesn't exist"""
     try:
-        pickled_data = pickle.dumps(df)
-        redis_client.set(key, pickled_data)
-        # redis_client.expire(key, 24 * 60 * 60)  # expire after 24h
-        logging.info(f"DataFrame stored in Redis with the key: {key}")
+        payload = redis_client.get(key)
+        if payload is None:
+            return None
+        return deserialize_df(payload)
     except Exception as e:
-        logging.error(f"Error storing in Redis: {str(e)}")
+        logging.error("Error loading from Redis: %s", e)
         raise
+
+
+def get_processed_game_ids(redis_client):
+    """
+    Get the ids of the finished games already stored in Redis.
+
+    With a TTL, the manifest outlives the games stored in the previous runs, as
+    each new member pushes its expiration back. The games whose data expired are
+    removed from it, so they are scraped and stored again.
+
+    Parameters:
+    - redis_client (Redis): The Redis client.
+
+    Returns:
+    - set: The ids of the games whose data is still in Redis.
+    """
+    game_ids = [int(game_id) for game_id in redis_client.smembers(PROCESSED_GAMES_KEY)]
+    if not game_ids:
+        return set()
+    data_key = "game_segments_{}" if REDIS_LAYOUT == 'segments' else "game_data_{}"
+    with redis_client.pipeline(transaction=False) as pipeline:
+        for game_id in game_ids:
+            pipeline.exists(data_key.format(game_id))
+        stored = pipeline.execute()
+    expired_ids = [game_id for game_id, exists in zip(game_ids, stored) if not exists]
+    if expired_ids:
+        logging.info("%s processed games expired from Redis, they are scraped again", len(expired_ids))
+        redis_client.srem(PROCESSED_GAMES_KEY, *expired_ids)
+    return {game_id for game_id, exists in zip(game_ids, stored) if exists}
+
+
+def merge_games_info(games_df, processed_games_info):
+    """
+    Merge the newly processed games into the existing games index.
+
+    Parameters:
+    - games_df (DataFrame): The games index stored in Redis, or None.
+    - processed_games_info (list): The game info dictionaries of the processed games.
+
+    Returns:
+    - DataFrame: The games index, where the processed games replace their previous version,
+      the new ones in the order they were stored.
+    """
+    new_games_df = pd.DataFrame(processed_games_info)
+    if games_df is None or games_df.empty:
+        return new_games_df
+    games_df = games_df[~games_df['game_id'].isin(new_games_df['game_id'])]
+    return pd.concat([games_df, new_games_df], ignore_index=True)
     
 
-def load_data():
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+def report_metrics(drivers):
+    """Logs the metrics summary of the batch job, and writes the metrics files"""
+    for name, value in drivers.stats().items():
+        metrics.count(f"drivers_{name}", value)
+    logging.info(metrics.report())
+    try:
+        if METRICS_JSON_PATH:
+            metrics.write_json(METRICS_JSON_PATH)
+        if METRICS_PROM_PATH:
+            metrics.write_prometheus(METRICS_PROM_PATH)
+    except OSError as e:
+        logging.error("Error writing the metrics: %s", e)
+
+
+def load_data(incremental=INCREMENTAL, offline=OFFLINE):
+    metrics.reset()
+    job_start = time.perf_counter()
+    redis_pool = redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, max_connections=REDIS_MAX_CONNECTIONS)
+    redis_client = redis.Redis(connection_pool=redis_pool)
+    sink = RedisSink(
+        redis_client,
+        batch_size=REDIS_BATCH_SIZE,
+        ttl=REDIS_TTL,
+        fmt=REDIS_FORMAT,
+        compression=REDIS_COMPRESSION
+    )
+
+    # Season totals per team and player, folded in as the games are stored
+    aggregates = AggregatesWriter(redis_client, batch_size=REDIS_BATCH_SIZE)
+
+    cache = RawMatchCache(RAW_CACHE_DIR, RAW_CACHE_MAX_MB * 1024**2) if RAW_CACHE_DIR else None
+    drivers = DriverManager(max_pages=DRIVER_MAX_PAGES, max_memory_mb=DRIVER_MAX_MEMORY_MB)
+    # The xT grid of the run is the last fitted one, the new finished games are counted to fit the next one
+    xt_corpus = XTCorpus.load(XT_MODEL_PATH, XT_GRID_SHAPE) if XT_MODEL_PATH else XTCorpus(XT_GRID_SHAPE)
+    xt_model = xt_corpus.model()
 
     logging.info("Start of batch job")
-    scraped_data = get_matches_data()
-    logging.info("Scraping done!")
-    logging.info("Starting data preprocessing...")
 
     processed_games_info = []
+    skip_ids = set()
+    if incremental:
+        skip_ids = get_processed_game_ids(redis_client)
+        logging.info("Incremental mode: %s finished games already in Redis", len(skip_ids))
 
-    for game_info, match_data in zip(scraped_data['games_info'].to_dict('records'), scraped_data['matches_data']):
+    def store_match(game_info, processed_df):
         game_id = game_info['game_id']
-        league = game_info['league']
+        processed_games_info.append(game_info)
+        # Unfinished games are left out of the manifest to be scraped again next run
+        memberships = [(PROCESSED_GAMES_KEY, game_id)] if game_info['finished'] else []
+        # The date, league, team and player indexes are written in the same transaction as the game
+        sink.add_game(
+            processed_df,
+            key=f"game_data_{game_id}" if REDIS_LAYOUT in ('blob', 'both') else None,
+            segments_key=f"game_segments_{game_id}" if REDIS_LAYOUT in ('segments', 'both') else None,
+            memberships=memberships,
+            scored_memberships=game_index_entries(game_info, processed_df)
+        )
+        aggregates.add(game_info, processed_df)
+        if XT_MODEL_PATH and game_info['finished']:
+            xt_corpus.add_game(game_id, processed_df)
+        logging.debug("Processed game data %s queued for Redis", game_id)
+        return game_id
 
-        logging.info(f"Starting preprocessing of game_id: {game_id}")
+    # The matches are scraped, parsed, preprocessed and stored at the same time, as soon as they come
+    pipeline = Pipeline([
+        Stage("parse", parse_raw_match, workers=PARSE_WORKERS, executor=PARSE_EXECUTOR),
+        Stage(
+            "preprocess",
+            functools.partial(preprocess_match, clubs_list=clubs_list, clubs_ids=clubs_ids, xt_model=xt_model),
+            workers=PREPROCESS_WORKERS,
+            executor=PREPROCESS_EXECUTOR,
+            chunksize=PREPROCESS_CHUNKSIZE
+        ),
+        Stage("store", store_match, workers=STORE_WORKERS, executor="thread")
+    ], queue_size=PIPELINE_QUEUE_SIZE, ordered=PIPELINE_ORDERED)
 
-        events_df = pd.DataFrame(match_data)
-        
-        processed_df = preprocess_events_df(
-            events_df,
-            league,
-            clubs_list,
-            clubs_ids
+    try:
+        raw_matches = iter_season_matches(
+            workers=SCRAPER_WORKERS,
+            skip_ids=skip_ids,
+            http_fetch=HTTP_FETCH,
+            cache=cache,
+            offline=offline,
+            drivers=drivers
         )
-        
-        game_info['game'] = processed_df.loc[0, 'game']
-        processed_games_info.append(game_info)
-        
-        store_df_in_redis(redis_client, f"game_data_{game_id}", processed_df)
-        logging.info(f"Processed game data {game_id} stored in Redis")
-            
+        pipeline.run(raw_matches)
+
+        logging.info("Scraping done!")
 
-    games_df = pd.DataFrame(processed_games_info)
-    store_df_in_redis(redis_client, "games", games_df)
-    logging.info(f"List of processed games stored in Redis. Total: {len(processed_games_info)} games")
+    finally:
+        drivers.close()
+        # The games already stored stay reachable even if the run crashes midway
+        sink.flush()
+        aggregates.flush()
+        if processed_games_info:
+            games_df = load_df_from_redis(redis_client, "games") if incremental else None
+            games_df = merge_games_info(games_df, processed_games_info)
+            sink.swap_in("games", games_df)
+            logging.info("List of processed games stored in Redis. New: %s, total: %s games", len(processed_games_info), len(games_df))
+        if XT_MODEL_PATH and xt_corpus.changed():
+            xt_corpus.fit()
+            xt_corpus.save(XT_MODEL_PATH)
+        metrics.add_time("total", time.perf_counter() - job_start)
+        report_metrics(drivers)
         
 
 if __name__ == "__main__":
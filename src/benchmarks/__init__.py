@@ -0,0 +1,18 @@
+# coding: utf-8
+
+"""
+ SWB -- SkillCorner Batch
+ Pipeline benchmarks reference module
+"""
+
+__version__ = "1.0"
+__author__ = "Yannis Rachid"
+__maintainer__ = "Yannis Rachid"
+__email__ = "yannis.rachid6@gmail.com"
+__date__ = "Oct 18th, 2026"
+__status__ = "Development"  # Prototype, Development, Production
+
+__all__ = ["make_match", "make_season", "match_page_html", "load_recorded_season", "run_benchmarks"]
+
+from .fixtures import make_match, make_season, match_page_html, load_recorded_season
+from .run import run_benchmarks
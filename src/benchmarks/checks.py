@@ -0,0 +1,187 @@
+import logging
+import os
+import sys
+import threading
+from requests.cookies import RequestsCookieJar
+from whoscored.fetcher import MatchFetcher, looks_like_captcha
+from whoscored.pool import WhoScoredPool
+from whoscored.whoscored import parse_match_data
+
+# Synthetic pages, hand-written after the markup of WhoScored: a match centre, a captcha,
+# an Incapsula block page and a match preview
+PAGES_DIR = os.path.join(os.path.dirname(__file__), 'pages')
+
+
+def load_page(name):
+    """Returns the HTML of a synthetic page"""
+    with open(os.path.join(PAGES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class PageResponse():
+    """HTTP response serving a synthetic page"""
+
+    ############################################################################
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    ############################################################################
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class PagesSession():
+    """HTTP session serving synthetic pages, by link"""
+
+    ############################################################################
+    def __init__(self, responses):
+        self.responses = responses
+        self.cookies = RequestsCookieJar()
+
+    ############################################################################
+    def get(self, link, timeout=None):
+        return self.responses[link]
+
+    ############################################################################
+    def close(self):
+        pass
+
+
+class BrowserDriver():
+    """Driver with the cookies of a browser session, none until a WhoScored page is loaded"""
+
+    ############################################################################
+    def __init__(self, page_loaded=True):
+        self.page_loaded = page_loaded
+
+    ############################################################################
+    def get_cookies(self):
+        if not self.page_loaded:
+            return []
+        return [{'name': 'incap_ses', 'value': 'saved', 'domain': '.whoscored.com', 'path': '/'}]
+
+
+class BrowserManager():
+    """Drivers manager of browsers already started"""
+
+    ############################################################################
+    def warm_up(self, count):
+        pass
+
+    ############################################################################
+    def close(self):
+        pass
+
+
+class BrowserScraper():
+    """Fallback scraper, returning the match data of the synthetic match page"""
+
+    ############################################################################
+    def __init__(self, page_loaded=True):
+        self.driver = BrowserDriver(page_loaded)
+        self.scraped_links = []
+
+    ############################################################################
+    def get_match_links(self, year, league, skip_ids=None):
+        self.driver.page_loaded = True
+        return {'https://www.whoscored.com/Matches/1821093/Live': ''}
+
+    ############################################################################
+    def scrape_match(self, link):
+        self.scraped_links.append(link)
+        return parse_match_data(load_page('match.html'))
+
+    ############################################################################
+    def recover(self):
+        pass
+
+    ############################################################################
+    def close(self):
+        pass
+
+
+def check_looks_like_captcha():
+    assert not looks_like_captcha(200, load_page('match.html')), "A match page is taken for a captcha"
+    assert not looks_like_captcha(200, load_page('no_match_data.html')), "A match preview is taken for a captcha"
+    assert looks_like_captcha(200, load_page('captcha.html')), "The captcha page is not detected"
+    assert looks_like_captcha(200, load_page('blocked.html')), "The Incapsula block page is not detected"
+    assert looks_like_captcha(403, ''), "A 403 response is not detected"
+    assert looks_like_captcha(429, ''), "A 429 response is not detected"
+
+
+def check_parse_match_data():
+    match_data = parse_match_data(load_page('match.html'))
+    assert match_data['matchId'] == 1821093, "Wrong match id"
+    assert len(match_data['matchCentreData']['events']) == 2, "Wrong events count"
+    assert match_data['matchCentreData']['playerIdNameDictionary']['91909'] == 'Bukayo Saka', "Wrong player names"
+    assert match_data['formationIdNameMappings'] == {'2': '442', '8': '4231'}, "Wrong trailing keys"
+    for name in ('captcha.html', 'blocked.html', 'no_match_data.html'):
+        try:
+            parse_match_data(load_page(name))
+        except ValueError:
+            continue
+        raise AssertionError(f"Match data found in {name}")
+
+
+def check_fetcher_fallback():
+    links = {
+        'https://www.whoscored.com/Matches/1821093/Live': PageResponse(200, load_page('match.html')),
+        'https://www.whoscored.com/Matches/1821094/Live': PageResponse(200, load_page('captcha.html')),
+        'https://www.whoscored.com/Matches/1821095/Live': PageResponse(403, load_page('blocked.html')),
+        'https://www.whoscored.com/Matches/1821096/Live': PageResponse(200, load_page('no_match_data.html'))
+    }
+    scraper = BrowserScraper()
+    fetcher = MatchFetcher(scraper, session_factory=lambda: PagesSession(links))
+    for link in links:
+        assert fetcher.fetch_match(link)['matchId'] == 1821093, f"No match data for {link}"
+    assert scraper.scraped_links == list(links)[1:], "The browser is not used exactly for the pages without match data"
+    assert fetcher.fallback_count == 3, "Wrong fallbacks count"
+    assert fetcher.session.cookies.get('incap_ses') == 'saved', "The browser cookies are not reloaded after a fallback"
+    # Every thread gets its own session, with the browser cookies
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(fetcher.session))
+    thread.start()
+    thread.join()
+    assert sessions[0] is not fetcher.session, "A session is shared between threads"
+    assert sessions[0].cookies.get('incap_ses') == 'saved', "The browser cookies are not copied into a new session"
+    assert len(fetcher.sessions) == 2, "Wrong sessions count"
+
+
+def check_pool_cookies():
+    pool = WhoScoredPool(workers=2, http_fetch=True, drivers=BrowserManager())
+    # The fetcher is built with the browser before it loads any WhoScored page
+    pool.scrapers = [BrowserScraper(page_loaded=False)]
+    pool.start()
+    pool.fetcher.session_factory = lambda: PagesSession({
+        'https://www.whoscored.com/Matches/1821093/Live': PageResponse(200, load_page('match.html'))
+    })
+    assert not pool.fetcher.cookies, "Cookies before any page is loaded"
+    matches = list(pool.iter_matches(2025, 'EPL'))
+    assert len(matches) == 1, "The match is not scraped"
+    # The match is fetched by a worker thread, with its own session
+    assert [session.cookies.get('incap_ses') for session in pool.fetcher.sessions] == ['saved'], "The browser cookies are not loaded before the matches are fetched"
+    assert pool.fetcher.fallback_count == 0, "The browser is used for a match page"
+    pool.close()
+
+
+CHECKS = [check_looks_like_captcha, check_parse_match_data, check_fetcher_fallback, check_pool_cookies]
+
+
+def main():
+    """Runs the checks on the synthetic pages, exits with 1 if one of them fails"""
+    logging.disable(logging.WARNING)
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"ok      {check.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED  {check.__name__}: {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
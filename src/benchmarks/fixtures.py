@@ -0,0 +1,172 @@
+import itertools
+import json
+import random
+from helper.clubs import clubs_ids
+
+# Share of each event type in a WhoScored match, roughly
+EVENT_TYPES = {
+    'Pass': 52, 'BallRecovery': 6, 'Aerial': 5, 'BallTouch': 5, 'TakeOn': 3, 'Tackle': 3,
+    'Clearance': 4, 'Interception': 2, 'Foul': 3, 'Dispossessed': 2, 'SavedShot': 1,
+    'MissedShots': 1, 'BlockedPass': 2, 'KeeperPickup': 1, 'CornerAwarded': 1, 'Challenge': 2,
+    'OffsidePass': 1, 'Card': 1, 'Goal': 1, 'Start': 1, 'End': 1, 'FormationSet': 1
+}
+# (value, displayName) of the qualifiers, with the probability to be on a pass
+QUALIFIERS = [
+    ((56, 'Zone'), 1.0), ((212, 'Length'), 1.0), ((213, 'Angle'), 1.0), ((140, 'PassEndX'), 1.0),
+    ((141, 'PassEndY'), 1.0), ((1, 'Longball'), 0.12), ((2, 'Cross'), 0.05), ((4, 'Throughball'), 0.01),
+    ((3, 'HeadPass'), 0.08), ((210, 'IntentionalAssist'), 0.01), ((11000, 'KeyPass'), 0.02),
+    ((5, 'FreekickTaken'), 0.02), ((6, 'CornerTaken'), 0.01), ((107, 'ThrowIn'), 0.04)
+]
+SHOT_QUALIFIERS = [(15, 'Head'), (20, 'RightFoot'), (72, 'LeftFoot'), (214, 'BigChance'), (22, 'RegularPlay'), (9, 'Penalty')]
+CARD_QUALIFIERS = [(31, 'Yellow'), (32, 'SecondYellow'), (33, 'Red')]
+ZONES = ['Back', 'Center', 'Left', 'Right']
+
+EVENTS_PER_MATCH = 1700
+
+
+def _qualifier(value, name, qualifier_value=None):
+    qualifier = {'type': {'value': value, 'displayName': name}}
+    if qualifier_value is not None:
+        qualifier['value'] = qualifier_value
+    return qualifier
+
+
+def _event_qualifiers(rng, type_name, x, y, end_x, end_y):
+    if type_name == 'Pass':
+        qualifiers = []
+        for (value, name), probability in QUALIFIERS:
+            if rng.random() < probability:
+                if name == 'Zone':
+                    qualifiers.append(_qualifier(value, name, rng.choice(ZONES)))
+                elif name == 'Length':
+                    qualifiers.append(_qualifier(value, name, f'{abs(end_x - x) + abs(end_y - y):.1f}'))
+                elif name == 'Angle':
+                    qualifiers.append(_qualifier(value, name, f'{rng.uniform(0, 6.28):.2f}'))
+                elif name == 'PassEndX':
+                    qualifiers.append(_qualifier(value, name, f'{end_x:.1f}'))
+                elif name == 'PassEndY':
+                    qualifiers.append(_qualifier(value, name, f'{end_y:.1f}'))
+                else:
+                    qualifiers.append(_qualifier(value, name))
+        return qualifiers
+    if type_name in ('SavedShot', 'MissedShots', 'Goal'):
+        return [_qualifier(*rng.choice(SHOT_QUALIFIERS)), _qualifier(56, 'Zone', 'Center'), _qualifier(22, 'RegularPlay')]
+    if type_name == 'Card':
+        return [_qualifier(*rng.choices(CARD_QUALIFIERS, weights=[20, 1, 1])[0])]
+    return [_qualifier(56, 'Zone', rng.choice(ZONES))] if rng.random() < 0.6 else []
+
+
+def make_match(match_id, home_id, away_id, events_count=EVENTS_PER_MATCH, seed=0, finished=True):
+    """
+    Build a synthetic raw match, shaped like the WhoScored match centre data.
+
+    Parameters:
+    - match_id (int): The match id.
+    - home_id (int): The home team id.
+    - away_id (int): The away team id.
+    - events_count (int): The number of events.
+    - seed (int): The random seed, the same seed gives the same match.
+    - finished (bool): Whether the match is over.
+
+    Returns:
+    - dict: The raw match data, with the 'matchId' and 'matchCentreData' keys.
+    """
+    rng = random.Random(seed)
+    types, weights = zip(*EVENT_TYPES.items())
+    players = {team_id: [team_id * 100 + number for number in range(1, 17)] for team_id in (home_id, away_id)}
+    events = []
+    for i, type_name in enumerate(rng.choices(types, weights=weights, k=events_count)):
+        team_id = home_id if rng.random() < 0.5 else away_id
+        x, y = round(rng.uniform(0, 100), 1), round(rng.uniform(0, 100), 1)
+        minute = i * 95 // events_count
+        event = {
+            'id': float(2700000000 + match_id % 100000 * 10000 + i),
+            'eventId': i + 1,
+            'minute': minute,
+            'second': rng.randint(0, 59),
+            'teamId': team_id,
+            'x': x,
+            'y': y,
+            'expandedMinute': minute,
+            'period': {'value': 1 if minute < 45 else 2, 'displayName': 'FirstHalf' if minute < 45 else 'SecondHalf'},
+            'type': {'value': 1, 'displayName': type_name},
+            'outcomeType': {'value': int(rng.random() < 0.8), 'displayName': 'Successful'},
+            'satisfiedEventsTypes': rng.sample(range(200), 6),
+            'isTouch': type_name not in ('Start', 'End', 'FormationSet', 'CornerAwarded')
+        }
+        end_x, end_y = round(rng.uniform(0, 100), 1), round(rng.uniform(0, 100), 1)
+        if type_name not in ('Start', 'End', 'FormationSet'):
+            event['playerId'] = rng.choice(players[team_id])
+        if type_name == 'Pass':
+            event['endX'], event['endY'] = end_x, end_y
+        if type_name in ('SavedShot', 'MissedShots', 'Goal'):
+            event['isShot'] = True
+        if type_name == 'Goal':
+            event['isGoal'] = True
+        event['qualifiers'] = _event_qualifiers(rng, type_name, x, y, end_x, end_y)
+        events.append(event)
+
+    home_goals = sum(1 for event in events if event.get('isGoal') and event['teamId'] == home_id)
+    away_goals = sum(1 for event in events if event.get('isGoal') and event['teamId'] == away_id)
+    score = f'{home_goals} : {away_goals}'
+    return {
+        'matchId': match_id,
+        'matchCentreData': {
+            'playerIdNameDictionary': {
+                str(player_id): f'Player {player_id}' for team_players in players.values() for player_id in team_players
+            },
+            'startDate': f'2025-{1 + match_id % 5:02d}-{1 + match_id % 28:02d}T20:00:00',
+            'score': score,
+            'elapsed': 'FT' if finished else "67'",
+            'ftScore': score if finished else '',
+            'events': events
+        },
+        'matchCentreEventTypeJson': {},
+        'formationIdNameMappings': {}
+    }
+
+
+def make_season(matches_count=380, events_count=EVENTS_PER_MATCH, league='Ligue 1', seed=0):
+    """
+    Build a synthetic season of the teams of the clubs referential, home and away.
+
+    Parameters:
+    - matches_count (int): The number of matches, a full season of 20 teams is 380.
+    - events_count (int): The number of events per match.
+    - league (string): The league name of the matches.
+    - seed (int): The random seed.
+
+    Yields:
+    - tuple: The (match_key, match_data, league) triple of each match, as yielded by iter_season_matches.
+    """
+    teams = list(clubs_ids.items())[:20]
+    fixtures = itertools.islice(itertools.cycle(itertools.permutations(teams, 2)), matches_count)
+    for i, ((home, home_id), (away, away_id)) in enumerate(fixtures):
+        match_id = 1821093 + i
+        link = f'https://www.whoscored.com/Matches/{match_id}/Live/France-Ligue-1-2024-2025-{home}-{away}'.replace(' ', '-')
+        yield link, make_match(match_id, home_id, away_id, events_count, seed + i), league
+
+
+def match_page_html(match_data):
+    """Returns a match page embedding the match data the way WhoScored does, with unquoted top level keys"""
+    args = ',\n'.join(f'{key}: {json.dumps(value)}' for key, value in match_data.items())
+    return (
+        '<html><head><title>Match Centre</title></head><body><div id="layout-wrapper"></div>'
+        f'<script>require.config.params["args"] = {{\n{args}\n}};</script></body></html>'
+    )
+
+
+def load_recorded_season(cache, year, league):
+    """
+    Read the matches recorded in a raw match cache, to benchmark real payloads.
+
+    Parameters:
+    - cache (RawMatchCache): The raw match cache.
+    - year (int): The season end year.
+    - league (string): The league name.
+
+    Yields:
+    - tuple: The (match_key, match_data, league) triple of each cached match.
+    """
+    for link, match_data in cache.iter_matches(year, league):
+        yield link, match_data, league
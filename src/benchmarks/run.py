@@ -0,0 +1,263 @@
+import argparse
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from helper.clubs import clubs_list, clubs_ids
+from storage import RedisSink, serialize_df, deserialize_df, serialize_segments, load_game
+from storage.serializers import SERIALIZERS, COMPRESSIONS
+from storage.segments import GAME_SEGMENTS_KEY
+from whoscored import WhoScored, RawMatchCache, parse_match_data, process_match_data, preprocess_events_df
+from whoscored.scraper import extract_events_columns
+from .fixtures import EVENTS_PER_MATCH, make_season, match_page_html, load_recorded_season
+
+# extract_events_columns is the tabularization done by process_match_data, timed on its own too
+STAGES = [
+    'parse_match_data', 'tabularize_match_data_events', 'extract_events_columns', 'process_match_data', 'preprocess_events_df',
+    'serialize_df', 'serialize_segments', 'redis_set', 'redis_sink'
+]
+
+
+def get_redis_client(host=None, port=6379):
+    """Returns a client of a local Redis server if a host is given, else of an in-memory fakeredis server"""
+    if host:
+        import redis
+        return redis.Redis(host=host, port=port)
+    try:
+        import fakeredis
+    except ImportError:
+        raise RuntimeError("fakeredis is needed to benchmark without a Redis server: pip install fakeredis, or use --redis-host")
+    return fakeredis.FakeRedis()
+
+
+def _run_match(match_key, match_data, league, html, redis_client, sink, fmt, compression, timed):
+    """Runs every stage on a match, timed calls the stage and returns its result"""
+    timed('parse_match_data', parse_match_data, html)
+    timed('tabularize_match_data_events', WhoScored.tabularize_match_data_events, match_data)
+    match_centre_data = match_data['matchCentreData']
+    timed('extract_events_columns', extract_events_columns, match_centre_data['events'], match_centre_data.get('playerIdNameDictionary', {}))
+    processed_data = timed('process_match_data', process_match_data, match_key, match_data, league)
+    processed_df = timed('preprocess_events_df', preprocess_events_df, processed_data['events_df'], league, clubs_list, clubs_ids)
+    timed('serialize_df', serialize_df, processed_df, fmt, compression)
+    timed('serialize_segments', serialize_segments, processed_df, compression)
+    game_id = processed_data['game_info']['game_id']
+    timed('redis_set', _store_df, redis_client, f"bench:game_data_{game_id}", processed_df, fmt, compression)
+    timed('redis_sink', sink.add, f"bench:sink:game_data_{game_id}", processed_df)
+    return processed_df
+
+
+def _store_df(redis_client, key, df, fmt, compression):
+    """Stores a game with a single SET, the write the Redis sink batches"""
+    redis_client.set(key, serialize_df(df, fmt, compression))
+
+
+def run_layout_benchmarks(processed_dfs, redis_client):
+    """
+    Measure the bytes written and the encoding and decoding times of every storage layout.
+
+    The blob layout is measured for every format and compression, and the
+    segments layout for every compression, on a full read and on the read of
+    the passes of a single team, the projection it is meant for. The segments
+    are read back from Redis, the decoding time includes the read.
+
+    Parameters:
+    - processed_dfs (list): The processed events of the games.
+    - redis_client (Redis): The Redis client the segments are read from.
+
+    Returns:
+    - list: The {layout, format, compression, read, bytes, encode_ms, decode_ms} results, per game.
+    """
+    results = []
+
+    def measure(layout, fmt, compression, read, encode, decode, store=None):
+        sizes, encode_durations, decode_durations = [], [], []
+        for i, df in enumerate(processed_dfs):
+            start = time.perf_counter()
+            stored = encode(i, df)
+            encode_durations.append(time.perf_counter() - start)
+            # The write to Redis isn't part of the encoding
+            if store is not None:
+                store(i, stored)
+            start = time.perf_counter()
+            decode(i, df, stored)
+            decode_durations.append(time.perf_counter() - start)
+            sizes.append(len(stored) if isinstance(stored, bytes) else sum(len(payload) for payload in stored.values()))
+        results.append({
+            'layout': layout,
+            'format': fmt,
+            'compression': compression,
+            'read': read,
+            'bytes': round(statistics.mean(sizes)),
+            'encode_ms': round(1000 * statistics.mean(encode_durations), 3),
+            'decode_ms': round(1000 * statistics.mean(decode_durations), 3)
+        })
+
+    for fmt in SERIALIZERS:
+        # The compression is ignored by pickle
+        for compression in (COMPRESSIONS if fmt != 'pickle' else [None]):
+            measure(
+                'blob', fmt, compression, 'all',
+                lambda i, df: serialize_df(df, fmt, compression),
+                lambda i, df, payload: deserialize_df(payload)
+            )
+
+    def store_segments(i, mapping):
+        key = GAME_SEGMENTS_KEY.format(game_id=f"bench_{i}")
+        redis_client.delete(key)
+        redis_client.hset(key, mapping=mapping)
+
+    for compression in COMPRESSIONS:
+        measure(
+            'segments', 'arrow', compression, 'all',
+            lambda i, df: serialize_segments(df, compression),
+            lambda i, df, mapping: load_game(redis_client, f"bench_{i}"),
+            store_segments
+        )
+        measure(
+            'segments', 'arrow', compression, 'team passes',
+            lambda i, df: serialize_segments(df, compression),
+            lambda i, df, mapping: load_game(
+                redis_client, f"bench_{i}", columns=['event_id', 'player_id', 'x', 'y', 'end_x', 'end_y'],
+                team_id=df['team_id'].dropna().iloc[0], event_groups=['pass']
+            ),
+            store_segments
+        )
+    return results
+
+
+def run_benchmarks(matches, redis_client, fmt='arrow', compression='zstd', memory_matches=5, batch_size=50, layout_matches=20):
+    """
+    Time every stage of the pipeline on a set of matches, then measure its peak memory.
+
+    The timing pass runs without tracemalloc, which slows the code down a lot,
+    and the memory pass only runs on the first memory_matches matches.
+
+    Parameters:
+    - matches (iterable): The (match_key, match_data, league) triples.
+    - redis_client (Redis): The Redis client the DataFrames are written to.
+    - fmt (string): The serialization format.
+    - compression (string): The compression codec, or None.
+    - memory_matches (int): The number of matches of the memory pass.
+    - batch_size (int): The batch size of the Redis sink.
+    - layout_matches (int): The number of matches the storage layouts are measured on.
+
+    Returns:
+    - dict: The results per stage and per storage layout, with the matches and events counts.
+    """
+    durations = {stage: [] for stage in STAGES}
+    peaks = {stage: 0 for stage in STAGES}
+    events_count = 0
+    matches_count = 0
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        durations[stage].append(time.perf_counter() - start)
+        return result
+
+    def traced(stage, function, *args):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = function(*args)
+        peaks[stage] = max(peaks[stage], tracemalloc.get_traced_memory()[1] - baseline)
+        return result
+
+    sink = RedisSink(redis_client, batch_size=batch_size, fmt=fmt, compression=compression)
+    memory_set = []
+    layout_set = []
+    for match_key, match_data, league in matches:
+        html = match_page_html(match_data)
+        processed_df = _run_match(match_key, match_data, league, html, redis_client, sink, fmt, compression, timed)
+        events_count += len(processed_df)
+        matches_count += 1
+        if len(layout_set) < layout_matches:
+            layout_set.append(processed_df)
+        if len(memory_set) < memory_matches:
+            memory_set.append((match_key, match_data, league, html))
+    # The last batch is part of the sink stage
+    timed('redis_sink', sink.flush)
+
+    tracemalloc.start()
+    try:
+        memory_sink = RedisSink(redis_client, batch_size=batch_size, fmt=fmt, compression=compression)
+        for match_key, match_data, league, html in memory_set:
+            _run_match(match_key, match_data, league, html, redis_client, memory_sink, fmt, compression, traced)
+        traced('redis_sink', memory_sink.flush)
+    finally:
+        tracemalloc.stop()
+
+    results = {'matches': matches_count, 'events': events_count, 'format': fmt, 'compression': compression, 'stages': {}}
+    results['layouts'] = run_layout_benchmarks(layout_set, redis_client)
+    for stage in STAGES:
+        total = sum(durations[stage])
+        results['stages'][stage] = {
+            'seconds': round(total, 6),
+            'mean_ms': round(1000 * total / max(matches_count, 1), 3),
+            'median_ms': round(1000 * statistics.median(durations[stage]), 3) if durations[stage] else None,
+            'matches_per_second': round(matches_count / total, 2) if total else None,
+            'events_per_second': round(events_count / total, 1) if total else None,
+            'peak_memory_mb': round(peaks[stage] / 1024**2, 2)
+        }
+    return results
+
+
+def format_results(results):
+    """Returns the results as a table"""
+    lines = [
+        f"{results['matches']} matches, {results['events']} events, {results['format']}/{results['compression']}",
+        f"{'stage':<30}{'total (s)':>11}{'mean (ms)':>11}{'median (ms)':>13}{'events/s':>13}{'peak (MB)':>11}"
+    ]
+    for stage, result in results['stages'].items():
+        lines.append(
+            f"{stage:<30}{result['seconds']:>11.3f}{result['mean_ms']:>11.2f}{result['median_ms'] or 0:>13.2f}"
+            f"{result['events_per_second'] or 0:>13.0f}{result['peak_memory_mb']:>11.2f}"
+        )
+    lines += ['', f"{'layout':<10}{'format':<9}{'compression':<13}{'read':<13}{'bytes/game':>12}{'encode (ms)':>13}{'decode (ms)':>13}"]
+    for result in results['layouts']:
+        lines.append(
+            f"{result['layout']:<10}{result['format']:<9}{str(result['compression']):<13}{result['read']:<13}"
+            f"{result['bytes']:>12}{result['encode_ms']:>13.2f}{result['decode_ms']:>13.2f}"
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the batch pipeline offline")
+    parser.add_argument('--matches', type=int, default=380, help="Number of synthetic matches, a full season by default")
+    parser.add_argument('--events', type=int, default=EVENTS_PER_MATCH, help="Number of events per synthetic match")
+    parser.add_argument('--cache', help="Raw match cache directory, to benchmark recorded matches instead of synthetic ones")
+    parser.add_argument('--year', type=int, default=2025, help="Season of the recorded matches")
+    parser.add_argument('--league', default='Ligue 1', help="League of the recorded matches")
+    parser.add_argument('--format', default='arrow', help="Serialization format: arrow, parquet or pickle")
+    parser.add_argument('--compression', default='zstd', help="Compression codec: zstd, lz4 or none")
+    parser.add_argument('--memory-matches', type=int, default=5, help="Number of matches of the peak memory pass")
+    parser.add_argument('--layout-matches', type=int, default=20, help="Number of matches the storage layouts are measured on")
+    parser.add_argument('--redis-host', help="Local Redis server, fakeredis is used if not set")
+    parser.add_argument('--redis-port', type=int, default=6379)
+    parser.add_argument('--json', help="Path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    if args.cache:
+        matches = load_recorded_season(RawMatchCache(args.cache), args.year, args.league)
+    else:
+        matches = make_season(args.matches, args.events, args.league)
+    compression = None if args.compression == 'none' else args.compression
+
+    results = run_benchmarks(
+        matches,
+        get_redis_client(args.redis_host, args.redis_port),
+        fmt=args.format,
+        compression=compression,
+        memory_matches=args.memory_matches,
+        layout_matches=args.layout_matches
+    )
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,15 @@ __email__ = "yannis.rachid6@gmail.com"
 __date__ = "Feb 20th, 2025"
 __status__ = "Development"  # Prototype, Development, Production
 
-__all__ = ["get_image_base64", "clubs_list", "clubs_ids"]
+__all__ = ["get_image_base64", "clubs_list", "clubs_ids", "parse_qualifiers", "flatten_qualifiers",
+           "unflatten_qualifiers", "qualifier_flags", "COMMON_QUALIFIERS", "ClubResolver", "club_resolver",
+           "get_club_resolver", "Metrics", "metrics", "Pipeline", "Stage", "XTModel", "XTCorpus", "get_xt_model",
+           "XT_GRID_SHAPE"]
 
 from helper.helper import get_image_base64
-from helper.clubs import clubs_list, clubs_ids
\ No newline at end of file
+from helper.clubs import clubs_list, clubs_ids
+from helper.qualifiers import parse_qualifiers, flatten_qualifiers, unflatten_qualifiers, qualifier_flags, COMMON_QUALIFIERS
+from helper.resolver import ClubResolver, club_resolver, get_club_resolver
+from helper.metrics import Metrics, metrics
+from helper.pipeline import Pipeline, Stage
+from helper.xt import XTModel, XTCorpus, get_xt_model, XT_GRID_SHAPE
\ No newline at end of file
@@ -1,5 +1,6 @@
 import base64
 import numpy as np
+from helper.resolver import get_club_resolver
 
 def get_image_base64(image_path):
     with open(image_path, "rb") as img_file:
@@ -56,13 +57,4 @@ def find_clubs(ws_name, clubs_list):
     Returns:
     - list: The list with the two clubs in the right order.
     """
-    # Normaliser d'abord le nom du match
-    ws_name = ws_name.replace(" ", "-")
-    
-    # Garder l'ordre original des équipes
-    found_clubs = []
-    for club in clubs_list:
-        if club.lower() in ws_name.lower():
-            found_clubs.append(club)
-    
-    return found_clubs
\ No newline at end of file
+    return get_club_resolver(clubs_list).find_clubs(ws_name)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Counter giving the throughput of a stage, reported as <counter>/s
+STAGE_RATES = {
+    'scrape': 'pages',
+    'parse': 'matches',
+    'preprocess': 'events',
+    'serialize': 'keys_written',
+    'redis_write': 'bytes_written',
+}
+
+
+def _label_string(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels if value is not None)
+
+
+class Metrics():
+    """
+    Timers and counters of the batch job, per stage and per league.
+
+    A timer accumulates the seconds and the calls of a stage, a counter a number
+    of items (pages, events, bytes, retries...). Both are keyed by their name and
+    an optional league. The worker processes send their snapshot back to the
+    parent, which merges it.
+    """
+
+    ############################################################################
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    ############################################################################
+    def reset(self):
+        with self.lock:
+            self.timers = {}
+            self.counters = {}
+
+    ############################################################################
+    def add_time(self, name, seconds, league=None, calls=1):
+        """Adds seconds spent in a stage"""
+        with self.lock:
+            timer = self.timers.setdefault((name, league), [0.0, 0])
+            timer[0] += seconds
+            timer[1] += calls
+
+    ############################################################################
+    @contextlib.contextmanager
+    def timer(self, name, league=None):
+        """Times the enclosed block as a call of the stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, league)
+
+    ############################################################################
+    def count(self, name, value=1, league=None):
+        """Increments a counter"""
+        with self.lock:
+            self.counters[(name, league)] = self.counters.get((name, league), 0) + value
+
+    ############################################################################
+    def snapshot(self):
+        """Returns a picklable copy of the timers and counters"""
+        with self.lock:
+            return {
+                'timers': {key: list(timer) for key, timer in self.timers.items()},
+                'counters': dict(self.counters)
+            }
+
+    ############################################################################
+    def merge(self, snapshot):
+        """Adds the timers and counters of a snapshot, from another process"""
+        for (name, league), (seconds, calls) in snapshot['timers'].items():
+            self.add_time(name, seconds, league, calls)
+        for (name, league), value in snapshot['counters'].items():
+            self.count(name, value, league)
+
+    ############################################################################
+    def total_time(self, name):
+        return sum(timer[0] for (timer_name, _), timer in self.timers.items() if timer_name == name)
+
+    ############################################################################
+    def total_count(self, name):
+        return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    ############################################################################
+    def to_dict(self):
+        """
+        Returns the metrics as a JSON-serializable dictionary.
+
+        Returns:
+        - dict: The 'stages' and 'counters' lists, each entry having a 'league' key
+          (None for the totals of the job).
+        """
+        snapshot = self.snapshot()
+        stages = []
+        for (name, league), (seconds, calls) in sorted(snapshot['timers'].items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            stage = {'stage': name, 'league': league, 'seconds': round(seconds, 6), 'calls': calls}
+            rate_counter = STAGE_RATES.get(name)
+            if rate_counter is not None and seconds > 0:
+                stage[f'{rate_counter}_per_second'] = round(snapshot['counters'].get((rate_counter, league), 0) / seconds, 3)
+            stages.append(stage)
+        counters = [
+            {'counter': name, 'league': league, 'value': value}
+            for (name, league), value in sorted(snapshot['counters'].items(), key=lambda item: (item[0][0], str(item[0][1])))
+        ]
+        return {'stages': stages, 'counters': counters}
+
+    ############################################################################
+    def report(self):
+        """Returns a human readable summary, one line per stage then per counter"""
+        metrics = self.to_dict()
+        lines = ['Batch job metrics:']
+        for stage in metrics['stages']:
+            line = f"  {stage['stage']:<18} {stage['league'] or 'all':<28} {stage['seconds']:>10.2f}s {stage['calls']:>8} calls"
+            rate_counter = STAGE_RATES.get(stage['stage'])
+            if f'{rate_counter}_per_second' in stage:
+                line += f"  {stage[f'{rate_counter}_per_second']:>12.1f} {rate_counter}/s"
+            lines.append(line)
+        for counter in metrics['counters']:
+            lines.append(f"  {counter['counter']:<18} {counter['league'] or 'all':<28} {counter['value']:>10}")
+        return '\n'.join(lines)
+
+    ############################################################################
+    def _write(self, path, content):
+        # Written then renamed, so a collector never reads a partial file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    ############################################################################
+    def write_json(self, path):
+        """Writes the metrics to a JSON file"""
+        self._write(path, json.dumps(self.to_dict(), indent=2))
+
+    ############################################################################
+    def write_prometheus(self, path, prefix='swb'):
+        """Writes the metrics to a file in the Prometheus text format, for the node exporter textfile collector"""
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds_total Seconds spent in each stage of the batch job.',
+            f'# TYPE {prefix}_stage_seconds_total counter'
+        ]
+        for (name, league), (seconds, _) in sorted(snapshot['timers'].items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            lines.append(f'{prefix}_stage_seconds_total{{{_label_string([("stage", name), ("league", league)])}}} {seconds:.6f}')
+        lines += [
+            f'# HELP {prefix}_stage_calls_total Calls of each stage of the batch job.',
+            f'# TYPE {prefix}_stage_calls_total counter'
+        ]
+        for (name, league), (_, calls) in sorted(snapshot['timers'].items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            lines.append(f'{prefix}_stage_calls_total{{{_label_string([("stage", name), ("league", league)])}}} {calls}')
+        for name in sorted({name for name, _ in snapshot['counters']}):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            for (counter_name, league), value in snapshot['counters'].items():
+                if counter_name == name:
+                    labels = _label_string([("league", league)])
+                    lines.append(f'{prefix}_{name}_total{{{labels}}} {value}' if labels else f'{prefix}_{name}_total {value}')
+        self._write(path, '\n'.join(lines) + '\n')
+
+
+# Metrics of the current process
+metrics = Metrics()
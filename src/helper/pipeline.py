@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from helper.metrics import metrics
+
+EXECUTORS = ("thread", "process", "async")
+DEFAULT_QUEUE_SIZE = 8
+
+# Sent down a queue once its producers are done, one per consumer
+_DONE = object()
+# Takes the place of an item dropped by a stage in an ordered pipeline, so the next ones aren't held back
+_DROPPED = object()
+
+
+def _call_chunk(function, items):
+    """Runs a stage function on a chunk of items, returns the results"""
+    return [function(*item) for item in items]
+
+
+def _call_chunk_in_process(function, items):
+    """Runs a stage function on a chunk of items in a worker process, returns the results and the metrics of the chunk"""
+    metrics.reset()
+    results = _call_chunk(function, items)
+    return results, metrics.snapshot()
+
+
+class Stage():
+    """
+    A step of a pipeline, run by its own workers.
+
+    The function is called with the unpacked item of the previous stage, and
+    returns the item of the next stage, or None to drop it. With the "thread"
+    and "process" executors, the function runs in a pool of that many threads
+    or processes. With "async", it is a coroutine function awaited by that many
+    workers on the event loop.
+
+    A worker takes up to chunksize items at once, and the function runs on the
+    whole chunk in a single executor call, so a process pool pays the transfer
+    of the function and of its arguments once per chunk.
+    """
+
+    ############################################################################
+    def __init__(self, name, function, workers=1, executor="thread", chunksize=1):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor}, expected one of {', '.join(EXECUTORS)}")
+        self.name = name
+        self.function = function
+        self.workers = max(1, int(workers))
+        self.executor = executor
+        self.chunksize = max(1, int(chunksize))
+        self.pool = None
+
+    ############################################################################
+    def start(self, workers=None):
+        workers = workers or self.workers
+        if self.executor == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.name)
+        elif self.executor == "process":
+            self.pool = ProcessPoolExecutor(max_workers=workers)
+
+    ############################################################################
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    ############################################################################
+    async def call(self, items):
+        """Runs the function on a chunk of items with the executor of the stage, returns the results"""
+        items = [item if isinstance(item, tuple) else (item,) for item in items]
+        start = time.perf_counter()
+        if self.executor == "async":
+            results = [await self.function(*item) for item in items]
+        elif self.executor == "process":
+            results, snapshot = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _call_chunk_in_process, self.function, items
+            )
+            metrics.merge(snapshot)
+        else:
+            results = await asyncio.get_running_loop().run_in_executor(self.pool, _call_chunk, self.function, items)
+        metrics.add_time(f"stage_{self.name}", time.perf_counter() - start, calls=len(items))
+        return results
+
+
+class _Channel():
+    """
+    Bounded queue between two stages.
+
+    The items are numbered in the source order. When ordered, the items put out
+    of order wait in a buffer until the previous ones are put, and a producer
+    running too far ahead of the next expected item waits, so the buffer is
+    bounded too.
+    """
+
+    ############################################################################
+    def __init__(self, size, ordered=False, window=None):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.ordered = ordered
+        self.window = max(1, window or size)
+        self.pending = {}
+        self.next_index = 0
+        self.condition = asyncio.Condition()
+
+    ############################################################################
+    async def put(self, index, item):
+        if not self.ordered:
+            await self.queue.put((index, item))
+            return
+        async with self.condition:
+            # The next expected item is always accepted, so the pipeline can't get stuck
+            await self.condition.wait_for(lambda: index < self.next_index + self.window)
+            self.pending[index] = item
+            while self.next_index in self.pending:
+                await self.queue.put((self.next_index, self.pending.pop(self.next_index)))
+                self.next_index += 1
+            self.condition.notify_all()
+
+    ############################################################################
+    async def get(self):
+        return await self.queue.get()
+
+    ############################################################################
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    ############################################################################
+    async def close(self, consumers):
+        for _ in range(consumers):
+            await self.queue.put(_DONE)
+
+
+class Pipeline():
+    """
+    Runs stages concurrently, connected by bounded queues.
+
+    The source iterator is read in its own thread, and every stage works as soon
+    as an item is queued for it, so the wall time tends towards the one of the
+    slowest stage instead of the sum of the stages. A full queue blocks the
+    stage feeding it, so at most queue_size items wait between two stages
+    whatever the speed of the source.
+
+    When ordered, every stage gets its items in the source order, and the last
+    stage runs with a single worker, so its calls are made in the source order
+    too. Otherwise the items go through the stages in completion order.
+    An exception in the source or in a stage stops the whole pipeline and is raised.
+    """
+
+    ############################################################################
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE, ordered=False):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.ordered = ordered
+        self.processed_count = 0
+
+    ############################################################################
+    def run(self, source):
+        """
+        Pushes the items of a source through the stages.
+
+        Parameters:
+        - source (iterable): The items of the first stage, read in a dedicated thread.
+
+        Returns:
+        - int: The number of items which went through the last stage.
+        """
+        return asyncio.run(self.run_async(source))
+
+    ############################################################################
+    def _workers(self, i):
+        """Returns the number of workers of a stage"""
+        if self.ordered and i == len(self.stages) - 1:
+            return 1
+        return self.stages[i].workers
+
+    ############################################################################
+    async def _produce(self, source_pool, iterator, channel, consumers):
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            with metrics.timer("stage_source"):
+                item = await loop.run_in_executor(source_pool, next, iterator, _DONE)
+            if item is _DONE:
+                break
+            await channel.put(index, item)
+            index += 1
+        await channel.close(consumers)
+
+    ############################################################################
+    async def _take_chunk(self, stage, in_channel):
+        """Waits for an item, then takes the ones already queued up to the chunk size, returns the chunk and if the channel is done"""
+        chunk = []
+        entry = await in_channel.get()
+        while entry is not _DONE:
+            chunk.append(entry)
+            if len(chunk) >= stage.chunksize:
+                return chunk, False
+            try:
+                entry = in_channel.get_nowait()
+            except asyncio.QueueEmpty:
+                return chunk, False
+        return chunk, True
+
+    ############################################################################
+    async def _work(self, stage, in_channel, out_channel):
+        done = False
+        while not done:
+            chunk, done = await self._take_chunk(stage, in_channel)
+            entries = [(index, item) for index, item in chunk if item is not _DROPPED]
+            results = await stage.call([item for _, item in entries]) if entries else []
+            outputs = dict(chunk)
+            outputs.update((index, _DROPPED if result is None else result) for (index, _), result in zip(entries, results))
+            for index, _ in chunk:
+                result = outputs[index]
+                if out_channel is None:
+                    self.processed_count += result is not _DROPPED
+                elif result is not _DROPPED or self.ordered:
+                    await out_channel.put(index, result)
+
+    ############################################################################
+    async def _close_stage(self, workers, out_channel, consumers):
+        """Waits for the workers of a stage, then tells the next stage that nothing else is coming"""
+        await asyncio.gather(*workers)
+        if out_channel is not None:
+            await out_channel.close(consumers)
+
+    ############################################################################
+    async def run_async(self, source):
+        """Same as run, from a running event loop"""
+        self.processed_count = 0
+        # The items a stage works on at once can get ahead of the next expected one
+        channels = [
+            _Channel(
+                self.queue_size,
+                self.ordered,
+                self.queue_size + (self._workers(i - 1) * self.stages[i - 1].chunksize if i else 0)
+            )
+            for i in range(len(self.stages))
+        ]
+        source_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="source")
+        iterator = iter(source)
+        tasks = []
+        try:
+            for i, stage in enumerate(self.stages):
+                stage.start(self._workers(i))
+            tasks.append(asyncio.create_task(self._produce(source_pool, iterator, channels[0], self._workers(0))))
+            for i, stage in enumerate(self.stages):
+                last = i == len(self.stages) - 1
+                out_channel = None if last else channels[i + 1]
+                workers = [asyncio.create_task(self._work(stage, channels[i], out_channel)) for _ in range(self._workers(i))]
+                tasks += workers
+                tasks.append(asyncio.create_task(
+                    self._close_stage(workers, out_channel, 0 if last else self._workers(i + 1))
+                ))
+            logging.info(
+                "Pipeline started%s: %s",
+                " in order" if self.ordered else "",
+                " -> ".join(
+                    f"{stage.name} ({self._workers(i)} {stage.executor}, chunks of {stage.chunksize})"
+                    for i, stage in enumerate(self.stages)
+                )
+            )
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # The source is closed from its thread, so a generator runs its cleanup there
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                await asyncio.get_running_loop().run_in_executor(source_pool, close)
+            source_pool.shutdown(wait=True)
+            for stage in self.stages:
+                stage.shutdown()
+        logging.info("Pipeline done: %d items processed", self.processed_count)
+        return self.processed_count
@@ -0,0 +1,107 @@
+import ast
+import itertools
+import json
+import numpy as np
+import pandas as pd
+
+# Qualifiers precomputed as boolean columns of the processed events, named "q_<displayName>"
+COMMON_QUALIFIERS = [
+    "Red", "SecondYellow", "Yellow", "KeyPass", "BigChance", "Assist", "IntentionalAssist",
+    "Cross", "Longball", "Throughball", "Head", "Penalty", "OwnGoal", "CornerTaken", "FreekickTaken"
+]
+
+
+def parse_qualifiers(qualifiers):
+    """
+    Parse the qualifiers of an event, without evaluating any code.
+
+    Parameters:
+    - qualifiers (list or string): The qualifiers list, or its JSON or Python literal representation.
+
+    Returns:
+    - list: The qualifiers list, other values are returned unchanged.
+    """
+    if not isinstance(qualifiers, str):
+        return qualifiers
+    try:
+        return json.loads(qualifiers)
+    except ValueError:
+        return ast.literal_eval(qualifiers)
+
+
+def flatten_qualifiers(qualifiers, event_ids=None):
+    """
+    Flatten the qualifiers lists of the events into a long table.
+
+    Parameters:
+    - qualifiers (Series): The qualifiers list of every event.
+    - event_ids (Series): The ids of the events, added as an 'event_id' column if given.
+
+    Returns:
+    - DataFrame: One row per qualifier, with the position of its event in 'event_index'.
+    """
+    lists = [q if isinstance(q, list) else [] for q in qualifiers]
+    counts = np.fromiter(map(len, lists), dtype=np.int32, count=len(lists))
+    flat = list(itertools.chain.from_iterable(lists))
+    types = [qualifier["type"] for qualifier in flat]
+    codes, categories = pd.factorize(np.array([t["displayName"] for t in types], dtype=object))
+    event_index = np.repeat(np.arange(len(lists), dtype=np.int32), counts)
+    qualifiers_df = pd.DataFrame({
+        "event_index": event_index,
+        "type_value": np.fromiter((t["value"] for t in types), dtype=np.int16, count=len(types)),
+        "type_name": pd.Categorical.from_codes(codes, categories),
+        "value": np.array([qualifier.get("value") for qualifier in flat], dtype=object)
+    })
+    if event_ids is not None:
+        qualifiers_df.insert(1, "event_id", np.asarray(event_ids)[event_index])
+    return qualifiers_df
+
+
+def unflatten_qualifiers(qualifiers_df, events_count):
+    """
+    Rebuild the qualifiers lists of the events from the long table.
+
+    Parameters:
+    - qualifiers_df (DataFrame): The table returned by flatten_qualifiers.
+    - events_count (int): The number of events.
+
+    Returns:
+    - list: The qualifiers list of every event, in the WhoScored format.
+    """
+    qualifiers = [[] for _ in range(events_count)]
+    for event_index, type_value, type_name, value in zip(
+        qualifiers_df["event_index"].tolist(),
+        qualifiers_df["type_value"].tolist(),
+        qualifiers_df["type_name"].astype(object).tolist(),
+        qualifiers_df["value"].astype(object).tolist()
+    ):
+        qualifier = {"type": {"value": type_value, "displayName": type_name}}
+        if isinstance(value, str):
+            qualifier["value"] = value
+        qualifiers[event_index].append(qualifier)
+    return qualifiers
+
+
+def qualifier_flags(qualifiers_df, events_count, names=COMMON_QUALIFIERS):
+    """
+    Compute one boolean column per qualifier from the long table.
+
+    Parameters:
+    - qualifiers_df (DataFrame): The table returned by flatten_qualifiers.
+    - events_count (int): The number of events.
+    - names (list): The qualifiers display names.
+
+    Returns:
+    - dict: The {"q_<name>": boolean array} dictionary, True where the event has the qualifier.
+    """
+    event_index = qualifiers_df["event_index"].to_numpy()
+    type_name = qualifiers_df["type_name"].astype("category")
+    codes = type_name.cat.codes.to_numpy()
+    categories = type_name.cat.categories
+    flags = {}
+    for name in names:
+        flag = np.zeros(events_count, dtype=bool)
+        if name in categories:
+            flag[event_index[codes == categories.get_loc(name)]] = True
+        flags[f"q_{name}"] = flag
+    return flags
@@ -0,0 +1,105 @@
+import functools
+import re
+import unicodedata
+from helper.clubs import clubs_list, clubs_ids
+
+# WhoScored slugs that differ from the clubs referential names
+CLUB_ALIASES = {
+    "VfB-Stuttgart": "Vfb-Stuttgart",
+    "Stuttgart": "Vfb-Stuttgart",
+    "Mainz": "Mainz-05",
+    "Heidenheim": "FC-Heidenheim",
+    "Koln": "FC-Koln",
+    "Borussia-Monchengladbach": "Borussia-M-Gladbach",
+    "Wolverhampton": "Wolves",
+    "Wolverhampton-Wanderers": "Wolves",
+    "Hellas-Verona": "Verona",
+    "Internazionale": "Inter",
+    "Parma": "Parma-Calcio-1913",
+    "Alaves": "Deportivo-Alaves",
+    "Kortrijk": "Kortijk",
+}
+
+SEPARATORS_PATTERN = re.compile(r"[\s_\-.']+")
+
+
+def normalize_club_name(name):
+    """
+    Normalize a club or game name into lowercase tokens, without accents.
+
+    Parameters:
+    - name (string): The name (ex: "VfB Stuttgart", "Vfb-Stuttgart").
+
+    Returns:
+    - tuple: The name tokens (ex: ("vfb", "stuttgart")).
+    """
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return tuple(token for token in SEPARATORS_PATTERN.split(name.lower()) if token)
+
+
+class ClubResolver():
+    """
+    Finds the clubs of a WhoScored game name and the names of the team ids.
+
+    The referential names and the aliases are indexed by their normalized tokens
+    once, then a game name is resolved in a single left-to-right scan taking the
+    longest club name at each position, so clubs are returned in the game order
+    and a club is never matched inside another club or word.
+    """
+
+    ############################################################################
+    def __init__(self, clubs_list, clubs_ids=None, aliases=CLUB_ALIASES):
+        self.index = {}
+        for club in clubs_list:
+            self.index.setdefault(normalize_club_name(club), club)
+        for alias, club in aliases.items():
+            self.index.setdefault(normalize_club_name(alias), club)
+        self.max_tokens = max((len(tokens) for tokens in self.index), default=0)
+
+        # The team names are the referential names, whatever the spelling of the ids keys
+        self.id_to_name = {}
+        for club, club_id in (clubs_ids or {}).items():
+            self.id_to_name[club_id] = self.index.get(normalize_club_name(club), club)
+
+    ############################################################################
+    def find_clubs(self, ws_name):
+        """
+        Find the clubs names in a game name.
+
+        Parameters:
+        - ws_name (string): The game string (ex: "paris-saint-germain-clermont-foot").
+
+        Returns:
+        - list: The clubs found, in the order of the game name (home then away).
+        """
+        tokens = normalize_club_name(ws_name)
+        found_clubs = []
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self.max_tokens, len(tokens) - i), 0, -1):
+                club = self.index.get(tokens[i:i + length])
+                if club is not None:
+                    found_clubs.append(club)
+                    i += length
+                    break
+            else:
+                i += 1
+        return found_clubs
+
+    ############################################################################
+    def team_name(self, team_id):
+        """Returns the club name of a team id, or "Team_<id>" if it is unknown"""
+        return self.id_to_name.get(team_id, f"Team_{team_id}")
+
+
+@functools.lru_cache(maxsize=8)
+def _build_club_resolver(clubs_list, clubs_ids):
+    return ClubResolver(clubs_list, dict(clubs_ids))
+
+
+def get_club_resolver(clubs_list, clubs_ids=None):
+    """Returns the resolver of a clubs referential, built only once per referential"""
+    return _build_club_resolver(tuple(clubs_list), tuple((clubs_ids or {}).items()))
+
+
+club_resolver = get_club_resolver(clubs_list, clubs_ids)
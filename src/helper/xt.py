@@ -0,0 +1,261 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import numpy as np
+
+# Number of cells along the length and the width of the pitch
+XT_GRID_SHAPE = (16, 12)
+# WhoScored coordinates are percentages of the pitch, the attacking team plays towards x = 100
+PITCH_SIZE = 100.0
+MOVE_TYPES = ("Pass",)
+MAX_ITERATIONS = 100
+CONVERGENCE_TOLERANCE = 1e-7
+
+
+def _edges(cells):
+    return np.linspace(0.0, PITCH_SIZE, cells + 1)
+
+
+def prior_grid(shape=XT_GRID_SHAPE):
+    """
+    Distance-based xT grid, used until a grid is fitted on enough matches.
+
+    Parameters:
+    - shape (tuple): The (length, width) number of cells.
+
+    Returns:
+    - ndarray: The grid, exp(-0.1 * distance to the goal) at the center of each cell.
+    """
+    x_edges, y_edges = _edges(shape[0]), _edges(shape[1])
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    distance_to_goal = np.sqrt((PITCH_SIZE - x_centers[:, None])**2 + (PITCH_SIZE / 2 - y_centers[None, :])**2)
+    return np.exp(-0.1 * distance_to_goal)
+
+
+class XTModel():
+    """
+    Expected Threat lookup on a grid of the pitch.
+
+    Locations are binned with np.digitize, so the xT of a whole match or season
+    is computed at once, as the grid value of the end cell minus the one of the
+    start cell for the successful moves, and 0 for the other events.
+    """
+
+    ############################################################################
+    def __init__(self, grid):
+        self.grid = np.asarray(grid, dtype=np.float32)
+        self.shape = self.grid.shape
+        # Inner edges only, the pitch bounds are taken by the first and last cells
+        self.x_bins = _edges(self.shape[0])[1:-1]
+        self.y_bins = _edges(self.shape[1])[1:-1]
+
+    ############################################################################
+    def cells(self, x, y):
+        """
+        Bin locations into the cells of the grid.
+
+        Parameters:
+        - x (array): The x coordinates.
+        - y (array): The y coordinates.
+
+        Returns:
+        - tuple: The (flat cell index, valid) arrays, locations with a missing coordinate are not valid.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        x_cells = np.digitize(np.where(valid, x, 0.0), self.x_bins)
+        y_cells = np.digitize(np.where(valid, y, 0.0), self.y_bins)
+        return x_cells * self.shape[1] + y_cells, valid
+
+    ############################################################################
+    def value(self, x, y):
+        """Returns the xT of locations, 0 for the ones with a missing coordinate"""
+        cells, valid = self.cells(x, y)
+        return np.where(valid, self.grid.ravel()[cells], np.float32(0))
+
+    ############################################################################
+    def added(self, type_name, outcome, start_x, start_y, end_x, end_y):
+        """
+        Compute the xT added by events.
+
+        Parameters:
+        - type_name (array): The event types.
+        - outcome (array): True for the successful events.
+        - start_x, start_y (array): The start locations.
+        - end_x, end_y (array): The end locations.
+
+        Returns:
+        - ndarray: The float32 xT added, 0 for the events which are not successful moves.
+        """
+        start_cells, start_valid = self.cells(start_x, start_y)
+        end_cells, end_valid = self.cells(end_x, end_y)
+        moves = np.isin(np.asarray(type_name, dtype=object), MOVE_TYPES) & np.asarray(outcome, dtype=bool)
+        moves &= start_valid & end_valid
+        grid = self.grid.ravel()
+        return np.where(moves, grid[end_cells] - grid[start_cells], np.float32(0)).astype(np.float32)
+
+
+class XTCorpus():
+    """
+    Counts of the matches an xT grid is fitted on, saved to disk with the grid.
+
+    The counts per cell (shots, goals, moves and successful move transitions)
+    add up match by match, so the grid is refitted from the counts only, and
+    only when new matches were added since the last fit. A match is counted
+    once, whatever the number of times it is processed.
+    """
+
+    ############################################################################
+    def __init__(self, shape=XT_GRID_SHAPE):
+        self.shape = tuple(shape)
+        cells = self.shape[0] * self.shape[1]
+        self.shots = np.zeros(cells, dtype=np.int64)
+        self.goals = np.zeros(cells, dtype=np.int64)
+        self.moves = np.zeros(cells, dtype=np.int64)
+        self.transitions = np.zeros((cells, cells), dtype=np.int64)
+        self.game_ids = set()
+        self.grid = prior_grid(self.shape)
+        self.fitted_fingerprint = None
+        self.lock = threading.Lock()
+
+    ############################################################################
+    def fingerprint(self):
+        """Returns a digest of the matches counted"""
+        return hashlib.sha256(','.join(map(str, sorted(self.game_ids))).encode('utf-8')).hexdigest()
+
+    ############################################################################
+    def changed(self):
+        """Returns True if matches were added since the grid was fitted"""
+        return bool(self.game_ids) and self.fingerprint() != self.fitted_fingerprint
+
+    ############################################################################
+    def model(self):
+        """Returns the model of the last fitted grid, or of the prior grid if none was fitted"""
+        return XTModel(self.grid)
+
+    ############################################################################
+    def add_game(self, game_id, events_df):
+        """
+        Count the events of a match, if it isn't counted yet.
+
+        Parameters:
+        - game_id (int): The match id.
+        - events_df (DataFrame): The processed events, with the type_name, outcome,
+          x, y, end_x, end_y, shot and goal columns.
+        """
+        binner = XTModel(self.grid)
+        start_cells, start_valid = binner.cells(events_df['x'], events_df['y'])
+        end_cells, end_valid = binner.cells(events_df['end_x'], events_df['end_y'])
+        type_name = events_df['type_name'].to_numpy(dtype=object)
+        outcome = events_df['outcome'].to_numpy(dtype=bool)
+        shots = events_df['shot'].to_numpy(dtype=bool) & start_valid
+        goals = events_df['goal'].to_numpy(dtype=bool) & shots
+        moves = np.isin(type_name, MOVE_TYPES) & start_valid
+        successful_moves = moves & outcome & end_valid
+
+        cells = len(self.shots)
+        with self.lock:
+            if game_id in self.game_ids:
+                return
+            self.game_ids.add(game_id)
+            self.shots += np.bincount(start_cells[shots], minlength=cells)
+            self.goals += np.bincount(start_cells[goals], minlength=cells)
+            self.moves += np.bincount(start_cells[moves], minlength=cells)
+            np.add.at(self.transitions, (start_cells[successful_moves], end_cells[successful_moves]), 1)
+
+    ############################################################################
+    def fit(self):
+        """
+        Fit the grid on the counted matches, by value iteration.
+
+        xT(cell) = P(shot) * P(goal | shot) + P(move) * sum(P(cell -> target) * xT(target))
+
+        Returns:
+        - XTModel: The model of the fitted grid.
+        """
+        with self.lock:
+            actions = self.shots + self.moves
+            shoot_probability = np.divide(self.shots, actions, out=np.zeros(len(actions)), where=actions > 0)
+            move_probability = np.divide(self.moves, actions, out=np.zeros(len(actions)), where=actions > 0)
+            goal_probability = np.divide(self.goals, self.shots, out=np.zeros(len(actions)), where=self.shots > 0)
+            # Failed moves lose the ball, they only lower the transition probabilities
+            transition_matrix = np.divide(
+                self.transitions, self.moves[:, None],
+                out=np.zeros(self.transitions.shape), where=self.moves[:, None] > 0
+            )
+
+            shot_value = shoot_probability * goal_probability
+            grid = np.zeros(len(actions))
+            for iteration in range(1, MAX_ITERATIONS + 1):
+                new_grid = shot_value + move_probability * (transition_matrix @ grid)
+                converged = np.abs(new_grid - grid).max() < CONVERGENCE_TOLERANCE
+                grid = new_grid
+                if converged:
+                    break
+
+            self.grid = grid.reshape(self.shape)
+            self.fitted_fingerprint = self.fingerprint()
+        logging.info("xT grid fitted on %s matches in %s iterations", len(self.game_ids), iteration)
+        return self.model()
+
+    ############################################################################
+    def save(self, path):
+        """Saves the counts and the grid, written then renamed so a reader never gets a partial file"""
+        tmp_path = f'{path}.tmp.npz'
+        with self.lock:
+            np.savez_compressed(
+                tmp_path,
+                shape=np.array(self.shape),
+                shots=self.shots,
+                goals=self.goals,
+                moves=self.moves,
+                transitions=self.transitions,
+                game_ids=np.array(sorted(self.game_ids), dtype=np.int64),
+                grid=self.grid,
+                fitted_fingerprint=np.array(self.fitted_fingerprint or '')
+            )
+        os.replace(tmp_path, path)
+
+    ############################################################################
+    @classmethod
+    def load(cls, path, shape=XT_GRID_SHAPE):
+        """
+        Load the counts and the grid saved in a file.
+
+        Parameters:
+        - path (string): The file path.
+        - shape (tuple): The grid shape, a file saved with another shape is ignored.
+
+        Returns:
+        - XTCorpus: The corpus, empty if the file doesn't exist or has another grid shape.
+        """
+        corpus = cls(shape)
+        if not os.path.exists(path):
+            return corpus
+        with np.load(path) as data:
+            if tuple(data['shape']) != corpus.shape:
+                logging.warning("The xT grid of %s is %s, not %s, it is fitted again", path, tuple(data['shape']), corpus.shape)
+                return corpus
+            corpus.shots = data['shots']
+            corpus.goals = data['goals']
+            corpus.moves = data['moves']
+            corpus.transitions = data['transitions']
+            corpus.game_ids = set(data['game_ids'].tolist())
+            corpus.grid = data['grid']
+            corpus.fitted_fingerprint = str(data['fitted_fingerprint']) or None
+        # A corpus saved before its last fit is fitted again
+        if corpus.changed():
+            corpus.fit()
+        return corpus
+
+
+@functools.lru_cache(maxsize=4)
+def get_xt_model(path=None, shape=XT_GRID_SHAPE):
+    """Returns the model of the grid saved in a file, or of the prior grid, loaded once per process"""
+    if path is None:
+        return XTModel(prior_grid(shape))
+    return XTCorpus.load(path, shape).model()
@@ -0,0 +1,23 @@
+# coding: utf-8
+
+"""
+ SWB -- SkillCorner Batch
+ Redis storage reference module
+"""
+
+__version__ = "1.0"
+__author__ = "Yannis Rachid"
+__maintainer__ = "Yannis Rachid"
+__email__ = "yannis.rachid6@gmail.com"
+__date__ = "Oct 18th, 2026"
+__status__ = "Development"  # Prototype, Development, Production
+
+__all__ = ["RedisSink", "AggregatesWriter", "load_season_aggregates", "game_index_entries", "last_game_ids", "game_ids_between",
+           "load_games", "load_game", "serialize_segments", "serialize_df", "deserialize_df", "flatten_qualifiers",
+           "unflatten_qualifiers", "FORMAT_VERSION"]
+
+from .serializers import serialize_df, deserialize_df, flatten_qualifiers, unflatten_qualifiers, FORMAT_VERSION
+from .sink import RedisSink
+from .aggregates import AggregatesWriter, load_season_aggregates
+from .indexes import game_index_entries, last_game_ids, game_ids_between, load_games
+from .segments import serialize_segments, load_game
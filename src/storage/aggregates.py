@@ -0,0 +1,214 @@
+import json
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import redis
+from helper.metrics import metrics
+
+TEAM_STATS_KEY = "team_stats:{league}"
+PLAYER_STATS_KEY = "player_stats:{league}"
+TEAM_NAMES_KEY = "team_names:{league}"
+PLAYER_NAMES_KEY = "player_names:{league}"
+# Contribution of a game to the aggregates, subtracted when the game is processed again
+GAME_STATS_KEY = "game_stats_{game_id}"
+
+INT_STATS = ["games", "events", "touches", "passes", "successful_passes", "shots", "goals", "yellow_cards", "red_cards"]
+FLOAT_STATS = ["xT"]
+MAX_WATCH_RETRIES = 5
+
+
+def game_stats(processed_df, by):
+    """
+    Compute the stats of a game per team or per player.
+
+    Parameters:
+    - processed_df (DataFrame): The processed events of the game.
+    - by (string): 'team_id' or 'player_id'.
+
+    Returns:
+    - dict: The {id: {stat: value}} dictionary, with the ids as strings.
+    """
+    df = processed_df[processed_df[by].notna()]
+    if df.empty:
+        return {}
+    type_name = df['type_name'].to_numpy(dtype=object)
+    card_type = df['cardType'].to_numpy(dtype=object) if 'cardType' in df.columns else np.full(len(df), None)
+    is_pass = type_name == 'Pass'
+    stats_df = pd.DataFrame({
+        by: df[by].to_numpy(dtype=np.int64),
+        'events': 1,
+        'touches': df['touch'].to_numpy(dtype=np.int64),
+        'passes': is_pass.astype(np.int64),
+        'successful_passes': (is_pass & df['outcome'].to_numpy(dtype=bool)).astype(np.int64),
+        'shots': df['shot'].to_numpy(dtype=np.int64),
+        'goals': df['goal'].to_numpy(dtype=np.int64),
+        'yellow_cards': (card_type == 'Yellow').astype(np.int64),
+        'red_cards': ((card_type == 'Red') | (card_type == 'SecondYellow')).astype(np.int64),
+        'xT': df['xT_added'].to_numpy(dtype=np.float64) if 'xT_added' in df.columns else 0.0
+    }).groupby(by).sum()
+    stats_df.insert(0, 'games', 1)
+    return {
+        str(row_id): {stat: (round(float(value), 6) if stat in FLOAT_STATS else int(value)) for stat, value in row.items()}
+        for row_id, row in zip(stats_df.index, stats_df.to_dict('records'))
+    }
+
+
+def _names(processed_df, id_column, name_column):
+    names = processed_df[[id_column, name_column]].dropna().drop_duplicates(id_column)
+    return {str(int(row_id)): str(name) for row_id, name in zip(names[id_column], names[name_column])}
+
+
+class AggregatesWriter():
+    """
+    Folds the processed games into season aggregates per team and per player.
+
+    The aggregates of a league are two Redis hashes with one "<id>:<stat>" field
+    per team or player stat, so a leaderboard is a single HGETALL. Each game's
+    contribution is stored alongside. When a game is processed again, its
+    previous contribution is subtracted in the same transaction as the new one
+    is added, so the totals stay right whatever the number of runs. The
+    contributions never expire, as the totals they are part of.
+    """
+
+    ############################################################################
+    def __init__(self, redis_client, batch_size=50):
+        self.redis_client = redis_client
+        self.batch_size = max(1, batch_size)
+        self.pending = {}
+        self.lock = threading.RLock()
+
+    ############################################################################
+    def __enter__(self):
+        return self
+
+    ############################################################################
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    ############################################################################
+    def add(self, game_info, processed_df):
+        """
+        Queues the contribution of a game, the batch is folded once it is full.
+
+        Parameters:
+        - game_info (dict): The game info, with the 'game_id' and 'league' keys.
+        - processed_df (DataFrame): The processed events of the game.
+        """
+        contribution = {
+            'league': game_info['league'],
+            'team': game_stats(processed_df, 'team_id'),
+            'player': game_stats(processed_df, 'player_id')
+        }
+        names = {
+            'team': _names(processed_df, 'team_id', 'team_name') if 'team_name' in processed_df.columns else {},
+            'player': _names(processed_df, 'player_id', 'player_name')
+        }
+        with self.lock:
+            # A game added twice in a batch only counts once, with its last version
+            self.pending[game_info['game_id']] = (contribution, names)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    ############################################################################
+    def _queue_increments(self, pipeline, level, league, old, new, updates_count):
+        """Queues the difference between the new and the old contribution of a game"""
+        key = (TEAM_STATS_KEY if level == 'team' else PLAYER_STATS_KEY).format(league=league)
+        for row_id in set(old) | set(new):
+            old_stats, new_stats = old.get(row_id, {}), new.get(row_id, {})
+            for stat in INT_STATS:
+                delta = new_stats.get(stat, 0) - old_stats.get(stat, 0)
+                if delta:
+                    pipeline.hincrby(key, f"{row_id}:{stat}", delta)
+                    updates_count[level] += 1
+            for stat in FLOAT_STATS:
+                delta = new_stats.get(stat, 0.0) - old_stats.get(stat, 0.0)
+                if delta:
+                    pipeline.hincrbyfloat(key, f"{row_id}:{stat}", round(delta, 6))
+                    updates_count[level] += 1
+
+    ############################################################################
+    def _requeue(self, pending):
+        """Puts back the games of a failed batch, unless a newer version of them was queued since"""
+        for game_id, item in pending.items():
+            self.pending.setdefault(game_id, item)
+
+    ############################################################################
+    def flush(self):
+        """Folds the queued games into the aggregates, in one transaction"""
+        with self.lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            stats_keys = [GAME_STATS_KEY.format(game_id=game_id) for game_id in pending]
+
+            for try_count in range(1, MAX_WATCH_RETRIES + 1):
+                with self.redis_client.pipeline(transaction=True) as pipeline:
+                    try:
+                        # The previous contributions can't change between their read and the new ones' write
+                        pipeline.watch(*stats_keys)
+                        previous = pipeline.mget(stats_keys)
+                        pipeline.multi()
+                        updates = {'team': 0, 'player': 0}
+                        for stats_key, payload, (game_id, (contribution, names)) in zip(stats_keys, previous, pending.items()):
+                            old = json.loads(payload) if payload is not None else {}
+                            # A game moved to another league leaves the aggregates of the previous one
+                            if old and old['league'] != contribution['league']:
+                                for level in ('team', 'player'):
+                                    self._queue_increments(pipeline, level, old['league'], old[level], {}, updates)
+                                old = {}
+                            for level in ('team', 'player'):
+                                self._queue_increments(pipeline, level, contribution['league'], old.get(level, {}), contribution[level], updates)
+                            pipeline.set(stats_key, json.dumps(contribution, separators=(',', ':')))
+                            if names['team']:
+                                pipeline.hset(TEAM_NAMES_KEY.format(league=contribution['league']), mapping=names['team'])
+                            if names['player']:
+                                pipeline.hset(PLAYER_NAMES_KEY.format(league=contribution['league']), mapping=names['player'])
+                        with metrics.timer('aggregates_write'):
+                            pipeline.execute()
+                        break
+                    except redis.WatchError:
+                        logging.warning("Aggregates changed during the update (Attempt %s), retrying", try_count)
+                        if try_count == MAX_WATCH_RETRIES:
+                            self._requeue(pending)
+                            raise
+                    except Exception as e:
+                        logging.error("Error folding games into the aggregates: %s", e)
+                        self._requeue(pending)
+                        raise
+            metrics.count('aggregated_games', len(pending))
+            logging.info(
+                "%d games folded into the aggregates: %d team and %d player stats updated",
+                len(pending), updates['team'], updates['player']
+            )
+
+
+def load_season_aggregates(redis_client, league, level='team'):
+    """
+    Read the season aggregates of a league, in a single read of the stats hash.
+
+    Parameters:
+    - redis_client (Redis): The Redis client.
+    - league (string): The league name.
+    - level (string): 'team' or 'player'.
+
+    Returns:
+    - DataFrame: One row per team or player having played, indexed by id, with its name and stats.
+    """
+    stats_key, names_key = (TEAM_STATS_KEY, TEAM_NAMES_KEY) if level == 'team' else (PLAYER_STATS_KEY, PLAYER_NAMES_KEY)
+    with redis_client.pipeline(transaction=False) as pipeline:
+        pipeline.hgetall(stats_key.format(league=league))
+        pipeline.hgetall(names_key.format(league=league))
+        fields, names = pipeline.execute()
+
+    rows = {}
+    for field, value in fields.items():
+        row_id, stat = field.decode('utf-8').split(':', 1)
+        rows.setdefault(int(row_id), {})[stat] = float(value)
+    columns = INT_STATS + FLOAT_STATS
+    df = pd.DataFrame.from_dict(rows, orient='index', columns=columns).fillna(0)
+    df[INT_STATS] = df[INT_STATS].astype(np.int64)
+    df = df[df['games'] > 0].sort_index()
+    df.index.name = f'{level}_id'
+    df.insert(0, 'name', [names.get(str(row_id).encode('utf-8'), b'').decode('utf-8') or None for row_id in df.index])
+    return df
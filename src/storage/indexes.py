@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from .serializers import deserialize_df
+from .segments import load_game
+
+# Sorted sets of game ids, scored by the kickoff timestamp. With a TTL, they outlive
+# the data of the games stored in the previous runs, which load_games leaves out
+GAMES_BY_DATE_KEY = "games_by_date"
+TEAM_GAMES_KEY = "team_games:{team_id}"
+PLAYER_GAMES_KEY = "player_games:{player_id}"
+LEAGUE_GAMES_KEY = "league_games:{league}"
+GAME_DATA_KEY = "game_data_{game_id}"
+
+
+def kickoff_timestamp(date):
+    """
+    Convert a WhoScored start date into a sorted set score.
+
+    Parameters:
+    - date (string): The start date (ex: "2025-01-01T20:00:00"), UTC if it has no timezone.
+
+    Returns:
+    - float: The POSIX timestamp, 0 if the date is missing or invalid.
+    """
+    if not date:
+        return 0.0
+    try:
+        kickoff = datetime.fromisoformat(str(date).replace('Z', '+00:00'))
+    except ValueError:
+        return 0.0
+    return (kickoff if kickoff.tzinfo else kickoff.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def game_index_entries(game_info, processed_df):
+    """
+    List the index entries of a game.
+
+    Parameters:
+    - game_info (dict): The game info, with the 'game_id', 'league' and 'date' keys.
+    - processed_df (DataFrame): The processed events of the game.
+
+    Returns:
+    - list: The (sorted set key, game id, kickoff timestamp) triples of the date, league, team and player indexes.
+    """
+    game_id = game_info['game_id']
+    score = kickoff_timestamp(game_info.get('date'))
+    keys = [GAMES_BY_DATE_KEY, LEAGUE_GAMES_KEY.format(league=game_info['league'])]
+    keys += [TEAM_GAMES_KEY.format(team_id=int(team_id)) for team_id in processed_df['team_id'].dropna().unique()]
+    keys += [PLAYER_GAMES_KEY.format(player_id=int(player_id)) for player_id in processed_df['player_id'].dropna().unique()]
+    return [(key, game_id, score) for key in keys]
+
+
+def last_game_ids(redis_client, index_key, count=5):
+    """
+    Get the ids of the last games of an index.
+
+    Parameters:
+    - redis_client (Redis): The Redis client.
+    - index_key (string): The index key (ex: TEAM_GAMES_KEY.format(team_id=304)).
+    - count (int): The number of games.
+
+    Returns:
+    - list: The game ids, the most recent first.
+    """
+    return [int(game_id) for game_id in redis_client.zrevrange(index_key, 0, count - 1)]
+
+
+def game_ids_between(redis_client, start, end, index_key=GAMES_BY_DATE_KEY):
+    """
+    Get the ids of the games of an index played in a date range.
+
+    Parameters:
+    - redis_client (Redis): The Redis client.
+    - start (datetime): The range start, included.
+    - end (datetime): The range end, included.
+    - index_key (string): The index key, every game by default.
+
+    Returns:
+    - list: The game ids, by kickoff date.
+    """
+    start_score, end_score = kickoff_timestamp(start.isoformat()), kickoff_timestamp(end.isoformat())
+    return [int(game_id) for game_id in redis_client.zrangebyscore(index_key, start_score, end_score)]
+
+
+def load_games(redis_client, game_ids):
+    """
+    Load the processed events of several games in a single read.
+
+    The games only stored as segments are loaded one by one with load_game.
+
+    Parameters:
+    - redis_client (Redis): The Redis client.
+    - game_ids (list): The game ids.
+
+    Returns:
+    - dict: The {game_id: DataFrame} dictionary, without the games missing from Redis.
+    """
+    if not game_ids:
+        return {}
+    payloads = redis_client.mget([GAME_DATA_KEY.format(game_id=game_id) for game_id in game_ids])
+    games = {}
+    for game_id, payload in zip(game_ids, payloads):
+        df = deserialize_df(payload) if payload is not None else load_game(redis_client, game_id)
+        if df is not None:
+            games[game_id] = df
+    return games
@@ -0,0 +1,227 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from helper.metrics import metrics
+from helper.qualifiers import flatten_qualifiers, unflatten_qualifiers
+
+# Redis hash of the segments of a game
+GAME_SEGMENTS_KEY = "game_segments_{game_id}"
+# Fields of the hash: the manifest, one schema per column group, the row positions
+# of each partition, and one segment per column group and partition
+MANIFEST_FIELD = "manifest"
+SCHEMA_FIELD = "schema:{group}"
+ROWS_FIELD = "rows:{partition}"
+SEGMENT_FIELD = "{group}:{partition}"
+
+# Columns read together, the q_* flags go with the flags and the unknown columns with "extra"
+COLUMN_GROUPS = {
+    "core": ["game_id", "event_id", "period_id", "team_id", "player_id", "type_id", "type_name", "minute", "second", "outcome"],
+    "location": ["x", "y", "end_x", "end_y"],
+    "names": ["player_name", "team_name", "h_a"],
+    "flags": ["touch", "shot", "goal", "cardType"],
+    "xt": ["xT_added"],
+    "qualifiers": ["qualifiers"]
+}
+_GROUP_OF_COLUMN = {column: group for group, columns in COLUMN_GROUPS.items() for column in columns}
+EVENT_GROUPS = ("pass", "shot", "other")
+# Team of the partitions of the events without team
+NO_TEAM = "none"
+# Uncompressed size, written before each compressed segment
+SEGMENT_SIZE = struct.Struct(">I")
+
+
+def column_group(column):
+    """Returns the group a column is stored in"""
+    if column in _GROUP_OF_COLUMN:
+        return _GROUP_OF_COLUMN[column]
+    return "flags" if column.startswith("q_") else "extra"
+
+
+def _pack(data, compression):
+    if compression is None:
+        return data
+    return SEGMENT_SIZE.pack(len(data)) + pa.compress(data, compression, asbytes=True)
+
+
+def _unpack(payload, compression):
+    if compression is None:
+        return pa.py_buffer(payload)
+    (size,) = SEGMENT_SIZE.unpack_from(payload)
+    return pa.decompress(memoryview(payload)[SEGMENT_SIZE.size:], size, compression)
+
+
+def _encode_categoricals(df):
+    """Replaces the categoricals by their codes, returns the frame and the {column: categories} dictionary"""
+    categories = {}
+    codes = {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            categories[column] = [str(category) for category in df[column].cat.categories]
+            codes[column] = df[column].cat.codes.to_numpy()
+    return (df.assign(**codes) if codes else df), categories
+
+
+def _partitions(df):
+    """Returns the {"<team id>:<event group>": row positions} dictionary of the non-empty partitions of a game"""
+    team_ids = df['team_id'].to_numpy(dtype=np.float64, na_value=np.nan)
+    shot = df['shot'].to_numpy(dtype=bool) if 'shot' in df.columns else np.zeros(len(df), dtype=bool)
+    is_pass = df['type_name'].to_numpy(dtype=object) == 'Pass'
+    event_groups = np.select([shot, is_pass], ["shot", "pass"], "other")
+    teams = [(str(int(team_id)), team_ids == team_id) for team_id in np.unique(team_ids[~np.isnan(team_ids)])]
+    teams.append((NO_TEAM, np.isnan(team_ids)))
+    partitions = {}
+    for team, team_mask in teams:
+        for event_group in EVENT_GROUPS:
+            rows = np.flatnonzero(team_mask & (event_groups == event_group)).astype(np.int32)
+            if len(rows):
+                partitions[f"{team}:{event_group}"] = rows
+    return partitions
+
+
+def serialize_segments(processed_df, compression="zstd"):
+    """
+    Serialize a game into the fields of its segments hash.
+
+    The rows are partitioned by team and event group (pass, shot or other), and the columns of each partition by column group, so a reader
+    only moves the bytes of the columns and events it asks for. A segment is an
+    Arrow record batch compressed as a whole, its schema is written once per
+    column group, and the categoricals are stored as codes, their categories
+    being in the schema, so the segments add up to about the size of the game
+    stored as one payload.
+
+    Parameters:
+    - processed_df (DataFrame): The processed events of the game.
+    - compression (string): The compression codec, between "zstd", "lz4" or None.
+
+    Returns:
+    - dict: The {field: payload} mapping, manifest included.
+    """
+    df = processed_df.reset_index(drop=True)
+    dtypes = {column: str(dtype) for column, dtype in df.dtypes.items()}
+    partitions = _partitions(df)
+
+    events_df, categories = _encode_categoricals(df.drop(columns='qualifiers', errors='ignore'))
+    # Converted once, the column groups are selected then the segments taken from the Arrow batch
+    events_batch = pa.RecordBatch.from_pandas(events_df, preserve_index=False)
+    columns_by_group = {}
+    for column in events_df.columns:
+        columns_by_group.setdefault(column_group(column), []).append(column)
+    # group: (batch, categories, rows of each partition)
+    batches = {
+        group: (events_batch.select(columns), {column: categories[column] for column in columns if column in categories}, partitions)
+        for group, columns in columns_by_group.items()
+    }
+
+    if 'qualifiers' in df.columns:
+        qualifiers_df = flatten_qualifiers(df['qualifiers'])
+        event_index = qualifiers_df['event_index'].to_numpy()
+        # The qualifiers point to the position of their event in its partition
+        event_partition = np.full(len(df), -1, dtype=np.int32)
+        position_in_partition = np.zeros(len(df), dtype=np.int32)
+        for i, rows in enumerate(partitions.values()):
+            event_partition[rows] = i
+            position_in_partition[rows] = np.arange(len(rows), dtype=np.int32)
+        qualifiers_df, qualifiers_categories = _encode_categoricals(qualifiers_df.assign(event_index=position_in_partition[event_index]))
+        qualifiers_rows = {
+            partition: np.flatnonzero(event_partition[event_index] == i) for i, partition in enumerate(partitions)
+        }
+        batches['qualifiers'] = (pa.RecordBatch.from_pandas(qualifiers_df, preserve_index=False), qualifiers_categories, qualifiers_rows)
+
+    mapping = {}
+    for group, (batch, group_categories, group_rows) in batches.items():
+        schema = batch.schema.with_metadata({"categories": json.dumps(group_categories, separators=(',', ':'))})
+        mapping[SCHEMA_FIELD.format(group=group)] = schema.serialize().to_pybytes()
+        for partition in partitions:
+            segment = batch.take(pa.array(group_rows[partition]))
+            mapping[SEGMENT_FIELD.format(group=group, partition=partition)] = _pack(segment.serialize().to_pybytes(), compression)
+
+    for partition, rows in partitions.items():
+        mapping[ROWS_FIELD.format(partition=partition)] = _pack(rows.tobytes(), compression)
+
+    manifest = {
+        "columns": list(df.columns),
+        "dtypes": dtypes,
+        "groups": list(batches),
+        "partitions": {partition: len(rows) for partition, rows in partitions.items()},
+        "compression": compression
+    }
+    mapping[MANIFEST_FIELD] = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+    return mapping
+
+
+def load_game(redis_client, game_id, columns=None, team_id=None, event_groups=None):
+    """
+    Load a projection of the processed events of a game, reading only the segments it needs.
+
+    Parameters:
+    - redis_client (Redis): The Redis client.
+    - game_id (int): The game id.
+    - columns (list): The columns to load, all of them by default.
+    - team_id (int): Only loads the events of this team.
+    - event_groups (list): Only loads the events of these groups, between 'pass', 'shot' and 'other'.
+
+    Returns:
+    - DataFrame: The events in the game order, None if the game isn't stored as segments.
+    """
+    key = GAME_SEGMENTS_KEY.format(game_id=game_id)
+    manifest_payload = redis_client.hget(key, MANIFEST_FIELD)
+    if manifest_payload is None:
+        return None
+    manifest = json.loads(manifest_payload)
+    compression = manifest['compression']
+
+    if columns is None:
+        columns = manifest['columns']
+    unknown = [column for column in columns if column not in manifest['dtypes']]
+    if unknown:
+        raise KeyError(f"Unknown columns for game {game_id}: {', '.join(unknown)}")
+    groups = [group for group in manifest['groups'] if any(column_group(column) == group for column in columns)]
+    event_groups = set(EVENT_GROUPS if event_groups is None else event_groups)
+    partitions = [
+        partition for partition in manifest['partitions']
+        if (team_id is None or partition.split(':')[0] == str(int(team_id))) and partition.split(':')[1] in event_groups
+    ]
+
+    if not partitions:
+        return pd.DataFrame({
+            column: pd.Series(dtype=object if column == 'qualifiers' else manifest['dtypes'][column]) for column in columns
+        })
+
+    # The row positions are only needed to put several partitions back in the game order
+    fields = [SCHEMA_FIELD.format(group=group) for group in groups]
+    if len(partitions) > 1:
+        fields += [ROWS_FIELD.format(partition=partition) for partition in partitions]
+    fields += [SEGMENT_FIELD.format(group=group, partition=partition) for partition in partitions for group in groups]
+    payloads = dict(zip(fields, redis_client.hmget(key, fields)))
+    metrics.count('segments_read', len(fields))
+    metrics.count('bytes_read', len(manifest_payload) + sum(len(payload) for payload in payloads.values() if payload is not None))
+
+    schemas = {group: pa.ipc.read_schema(pa.py_buffer(payloads[SCHEMA_FIELD.format(group=group)])) for group in groups}
+    categories = {group: json.loads(schema.metadata[b"categories"]) for group, schema in schemas.items()}
+    pieces = []
+    for partition in partitions:
+        frames = []
+        for group in groups:
+            data = _unpack(payloads[SEGMENT_FIELD.format(group=group, partition=partition)], compression)
+            frame = pa.ipc.read_record_batch(data, schemas[group]).to_pandas()
+            for column, column_categories in categories[group].items():
+                frame[column] = pd.Categorical.from_codes(frame[column].to_numpy(), column_categories)
+            if group == 'qualifiers':
+                frame = pd.DataFrame({'qualifiers': unflatten_qualifiers(frame, manifest['partitions'][partition])})
+            frames.append(frame)
+        piece = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+        if len(partitions) > 1:
+            rows = _unpack(payloads[ROWS_FIELD.format(partition=partition)], compression)
+            piece.index = np.frombuffer(rows, dtype=np.int32)
+        pieces.append(piece)
+
+    df = pd.concat(pieces).sort_index() if len(pieces) > 1 else pieces[0]
+    df = df[columns].reset_index(drop=True)
+
+    # Nullable integers come back as floats from Arrow
+    for column in columns:
+        if column != 'qualifiers' and str(df[column].dtype) != manifest['dtypes'][column]:
+            df[column] = df[column].astype(manifest['dtypes'][column])
+    return df
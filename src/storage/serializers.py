@@ -0,0 +1,122 @@
+import io
+import pickle
+import struct
+import pyarrow as pa
+import pyarrow.parquet as pq
+from helper.qualifiers import flatten_qualifiers, unflatten_qualifiers
+
+# Every payload starts with: magic (3 bytes), format version, serializer id, compression id
+MAGIC = b"SWB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">3sBBB")
+TABLE_LENGTH = struct.Struct(">Q")
+
+COMPRESSIONS = {None: 0, "lz4": 1, "zstd": 2}
+COMPRESSION_NAMES = {value: key for key, value in COMPRESSIONS.items()}
+
+
+def _arrow_dumps(df, compression):
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=compression)) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _arrow_loads(data):
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+
+def _parquet_dumps(df, compression):
+    sink = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df), sink, compression=compression or "none")
+    return sink.getvalue()
+
+
+def _parquet_loads(data):
+    return pq.read_table(io.BytesIO(data)).to_pandas()
+
+
+# name: (serializer id, dumps, loads)
+SERIALIZERS = {
+    "pickle": (1, None, None),
+    "arrow": (2, _arrow_dumps, _arrow_loads),
+    "parquet": (3, _parquet_dumps, _parquet_loads)
+}
+SERIALIZER_NAMES = {value[0]: key for key, value in SERIALIZERS.items()}
+
+
+def serialize_df(df, fmt="arrow", compression="zstd"):
+    """
+    Serialize a DataFrame into a versioned payload.
+
+    With the columnar formats, the nested 'qualifiers' column is stored as a child table.
+
+    Parameters:
+    - df (DataFrame): The DataFrame to serialize.
+    - fmt (string): The serializer, between "arrow", "parquet" or "pickle".
+    - compression (string): The compression codec, between "zstd", "lz4" or None (ignored by pickle).
+
+    Returns:
+    - bytes: The payload, header included.
+    """
+    if fmt not in SERIALIZERS:
+        raise ValueError(f"Unknown serialization format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+
+    serializer_id, dumps, _ = SERIALIZERS[fmt]
+    if dumps is None:
+        return HEADER.pack(MAGIC, FORMAT_VERSION, serializer_id, 0) + pickle.dumps(df)
+
+    if "qualifiers" in df.columns:
+        qualifiers_df = flatten_qualifiers(df["qualifiers"])
+        # An all-null placeholder keeps the position of the column
+        df = df.assign(qualifiers=None)
+    else:
+        qualifiers_df = None
+
+    events_data = dumps(df, compression)
+    qualifiers_data = dumps(qualifiers_df, compression) if qualifiers_df is not None else b""
+    return b"".join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, serializer_id, COMPRESSIONS[compression]),
+        TABLE_LENGTH.pack(len(events_data)),
+        events_data,
+        qualifiers_data
+    ])
+
+
+def deserialize_df(payload):
+    """
+    Deserialize a payload written by serialize_df.
+
+    Payloads without header are read as plain pickles, as written by the previous batch versions.
+
+    Parameters:
+    - payload (bytes): The payload.
+
+    Returns:
+    - DataFrame: The deserialized DataFrame.
+    """
+    if payload[:len(MAGIC)] != MAGIC:
+        return pickle.loads(payload)
+
+    _, version, serializer_id, _ = HEADER.unpack_from(payload)
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported payload format version: {version}")
+    if serializer_id not in SERIALIZER_NAMES:
+        raise ValueError(f"Unknown serializer id: {serializer_id}")
+
+    _, _, loads = SERIALIZERS[SERIALIZER_NAMES[serializer_id]]
+    body = memoryview(payload)[HEADER.size:]
+    if loads is None:
+        return pickle.loads(body)
+
+    (events_length,) = TABLE_LENGTH.unpack_from(body)
+    events_data = body[TABLE_LENGTH.size:TABLE_LENGTH.size + events_length]
+    qualifiers_data = body[TABLE_LENGTH.size + events_length:]
+
+    df = loads(events_data)
+    if len(qualifiers_data):
+        df["qualifiers"] = unflatten_qualifiers(loads(qualifiers_data), len(df))
+    return df
@@ -0,0 +1,156 @@
+import logging
+import threading
+from helper.metrics import metrics
+from .serializers import serialize_df
+from .segments import serialize_segments
+
+
+class RedisSink():
+    """
+    Buffered Redis writer.
+
+    DataFrames are serialized as soon as they are added, then written by batches
+    through a single pipeline, so the load time no longer depends on one network
+    round-trip per key. The sink can be shared by several threads, the
+    serialization runs outside of its lock.
+    """
+
+    ############################################################################
+    def __init__(self, redis_client, batch_size=50, ttl=None, transaction=True, fmt="arrow", compression="zstd"):
+        self.redis_client = redis_client
+        self.batch_size = max(1, batch_size)
+        self.ttl = ttl
+        self.transaction = transaction
+        self.fmt = fmt
+        self.compression = compression
+        self.pipeline = redis_client.pipeline(transaction=transaction)
+        self.lock = threading.RLock()
+        self.pending_keys = []
+        self.pending_bytes = 0
+        self.written_count = 0
+        self.written_bytes = 0
+
+    ############################################################################
+    def __enter__(self):
+        return self
+
+    ############################################################################
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    ############################################################################
+    def add(self, key, df, memberships=(), scored_memberships=()):
+        """
+        Queues a DataFrame, the batch is written once it is full.
+
+        Parameters:
+        - key (string): The Redis key of the DataFrame.
+        - df (DataFrame): The DataFrame to store.
+        - memberships (iterable): (set key, member) pairs written in the same batch as the DataFrame.
+        - scored_memberships (iterable): (sorted set key, member, score) triples written in the same batch as the DataFrame.
+        """
+        self.add_game(df, key, memberships=memberships, scored_memberships=scored_memberships)
+
+    ############################################################################
+    def add_game(self, df, key=None, segments_key=None, memberships=(), scored_memberships=()):
+        """
+        Queues a game as one payload, as segments or both, the batch is written once it is full.
+
+        Everything is queued at once, so the payload, the segments and the memberships
+        of a game are always written in the same batch. The previous segments are
+        deleted in that batch, so no field of a previous version is left.
+
+        Parameters:
+        - df (DataFrame): The processed events of the game.
+        - key (string): The Redis key of the payload, not written if None.
+        - segments_key (string): The Redis key of the segments hash, not written if None.
+        - memberships (iterable): (set key, member) pairs written in the same batch as the game.
+        - scored_memberships (iterable): (sorted set key, member, score) triples written in the same batch as the game.
+        """
+        with metrics.timer('serialize'):
+            payload = serialize_df(df, self.fmt, self.compression) if key is not None else None
+            mapping = serialize_segments(df, self.compression) if segments_key is not None else None
+        with self.lock:
+            if key is not None:
+                self.pipeline.set(key, payload, ex=self.ttl)
+                self.pending_keys.append(key)
+                self.pending_bytes += len(payload)
+            if segments_key is not None:
+                self.pipeline.delete(segments_key)
+                self.pipeline.hset(segments_key, mapping=mapping)
+                if self.ttl:
+                    self.pipeline.expire(segments_key, self.ttl)
+                self.pending_keys.append(segments_key)
+                self.pending_bytes += sum(len(field_payload) for field_payload in mapping.values())
+            for set_key, member in memberships:
+                self.add_member(set_key, member)
+            for set_key, member, score in scored_memberships:
+                self.add_scored_member(set_key, member, score)
+            if len(self.pending_keys) >= self.batch_size:
+                self.flush()
+
+    ############################################################################
+    def add_member(self, key, member):
+        """Queues the addition of a member to a set, written in the same batch as the DataFrames"""
+        with self.lock:
+            self.pipeline.sadd(key, member)
+            if self.ttl:
+                # Every new member pushes the expiration back, so the set outlives the keys
+                # it references from the previous runs: its readers check that they still exist
+                self.pipeline.expire(key, self.ttl)
+
+    ############################################################################
+    def add_scored_member(self, key, member, score):
+        """Queues the addition of a member to a sorted set, written in the same batch as the DataFrames"""
+        with self.lock:
+            self.pipeline.zadd(key, {member: score})
+            if self.ttl:
+                # Same as the sets, the indexes may list games whose data expired
+                self.pipeline.expire(key, self.ttl)
+
+    ############################################################################
+    def flush(self):
+        """Writes the queued commands"""
+        with self.lock:
+            if not len(self.pipeline):
+                return
+            try:
+                with metrics.timer('redis_write'):
+                    self.pipeline.execute()
+                self.written_count += len(self.pending_keys)
+                self.written_bytes += self.pending_bytes
+                metrics.count('keys_written', len(self.pending_keys))
+                metrics.count('bytes_written', self.pending_bytes)
+                logging.info("%d DataFrames stored in Redis", len(self.pending_keys))
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("Keys stored in Redis: %s", ', '.join(self.pending_keys))
+            except Exception as e:
+                logging.error("Error storing in Redis: %s", e)
+                raise
+            finally:
+                self.pipeline.reset()
+                self.pending_keys = []
+                self.pending_bytes = 0
+
+    ############################################################################
+    def swap_in(self, key, df):
+        """
+        Replaces a DataFrame only once every queued write is done.
+
+        The DataFrame is written under a temporary key then renamed, so readers
+        see either the previous version or the new one, never a partial write.
+        """
+        self.flush()
+        with metrics.timer('serialize'):
+            payload = serialize_df(df, self.fmt, self.compression)
+        tmp_key = f"{key}:tmp"
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.set(tmp_key, payload, ex=self.ttl)
+        pipeline.rename(tmp_key, key)
+        with metrics.timer('redis_write'):
+            pipeline.execute()
+        self.written_count += 1
+        self.written_bytes += len(payload)
+        metrics.count('keys_written')
+        metrics.count('bytes_written', len(payload))
+        logging.info("DataFrame swapped in Redis with the key: %s", key)
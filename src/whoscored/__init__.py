@@ -12,7 +12,13 @@ __email__ = "yannis.rachid6@gmail.com"
 __date__ = "Feb 22th, 2025"
 __status__ = "Development"  # Prototype, Development, Production
 
-__all__ = ["WhoScored", "process_match_data", "get_matches_data", "preprocess_events_df"]
+__all__ = ["WhoScored", "WhoScoredPool", "DriverManager", "MatchFetcher", "RawMatchCache", "get_match_id", "parse_match_data", "discover_fixtures", "parse_fixtures_feed", "select_fixture_links", "process_match_data", "get_matches_data", "iter_matches_data", "iter_season_matches", "parse_raw_match", "preprocess_match", "preprocess_events_df", "EVENTS_SCHEMA", "GAME_COLUMNS", "apply_schema", "split_game_columns", "with_game_columns"]
 
-from .whoscored import WhoScored
-from .scraper import process_match_data, get_matches_data, preprocess_events_df
\ No newline at end of file
+from .whoscored import WhoScored, get_match_id, parse_match_data
+from .fixtures import discover_fixtures, parse_fixtures_feed, select_fixture_links
+from .pool import WhoScoredPool
+from .drivers import DriverManager
+from .fetcher import MatchFetcher
+from .cache import RawMatchCache
+from .scraper import process_match_data, get_matches_data, iter_matches_data, iter_season_matches, parse_raw_match, preprocess_match, preprocess_events_df
+from .schema import EVENTS_SCHEMA, GAME_COLUMNS, apply_schema, split_game_columns, with_game_columns
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+
+
+class RawMatchCache():
+    """
+    On-disk cache of the raw scraped match data.
+
+    The compressed JSON payloads are stored under their SHA-256 digest, and an
+    index maps every match id to its payload, link, league, season and status.
+    The least recently used matches are evicted once the cache is over its size
+    limit. Unfinished matches are kept but reported as stale, so they are
+    scraped again.
+
+    The index is written every save_every stored matches and on flush, not on
+    every put.
+    """
+
+    ############################################################################
+    def __init__(self, directory, max_bytes=2 * 1024**3, save_every=50):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.save_every = max(1, int(save_every))
+        self.index_path = os.path.join(directory, 'index.json')
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        # Matches referencing each payload, and the size of the payloads, kept up to date by put and evict
+        self.references = {}
+        self.total_size = 0
+        for entry in self.index.values():
+            self._add_reference(entry)
+        self.unsaved_count = 0
+        logging.info("Raw match cache opened in %s: %d matches", directory, len(self.index))
+
+    ############################################################################
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], f'{digest}.json.gz')
+
+    ############################################################################
+    def _save_index(self):
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self.unsaved_count = 0
+
+    ############################################################################
+    def flush(self):
+        """Writes the index if it changed since it was last written"""
+        if self.unsaved_count:
+            self._save_index()
+
+    ############################################################################
+    def _changed(self):
+        """Counts a change of the index, and writes it every save_every changes"""
+        self.unsaved_count += 1
+        if self.unsaved_count >= self.save_every:
+            self._save_index()
+
+    ############################################################################
+    def _add_reference(self, entry):
+        count = self.references.get(entry['digest'], 0)
+        if count == 0:
+            self.total_size += entry['size']
+        self.references[entry['digest']] = count + 1
+
+    ############################################################################
+    def _drop_reference(self, entry):
+        """Removes the payload of an index entry, unless another match still references it"""
+        count = self.references.pop(entry['digest']) - 1
+        if count:
+            self.references[entry['digest']] = count
+            return
+        self.total_size -= entry['size']
+        try:
+            os.remove(self._object_path(entry['digest']))
+        except FileNotFoundError:
+            pass
+
+    ############################################################################
+    def size(self):
+        """Returns the total size of the cached payloads, in bytes"""
+        return self.total_size
+
+    ############################################################################
+    def is_fresh(self, match_id):
+        """Returns True if the match is cached and finished, so it doesn't need to be scraped again"""
+        entry = self.index.get(str(match_id))
+        return entry is not None and entry['finished']
+
+    ############################################################################
+    def fresh_ids(self):
+        """Returns the ids of the cached finished matches"""
+        return {int(match_id) for match_id, entry in self.index.items() if entry['finished']}
+
+    ############################################################################
+    def get(self, match_id):
+        """
+        Read a cached match.
+
+        Parameters:
+        - match_id (int): The match id.
+
+        Returns:
+        - dict: The raw match data, or None if the match is not cached.
+        """
+        entry = self.index.get(str(match_id))
+        if entry is None:
+            return None
+        try:
+            with gzip.open(self._object_path(entry['digest']), 'rb') as f:
+                match_data = json.loads(f.read())
+        except OSError as e:
+            logging.warning("Cached match %s is unreadable, dropping it: %s", match_id, e)
+            self._drop_reference(self.index.pop(str(match_id)))
+            self._changed()
+            return None
+        entry['accessed'] = time.time()
+        return match_data
+
+    ############################################################################
+    def put(self, match_id, link, league, year, match_data, finished):
+        """
+        Store a raw match, then evict the least recently used matches if the cache is full.
+
+        Parameters:
+        - match_id (int): The match id.
+        - link (string): The match link.
+        - league (string): The league name.
+        - year (int): The season end year.
+        - match_data (dict): The raw match data.
+        - finished (bool): Whether the match is over.
+        """
+        data = json.dumps(match_data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        # The digest is the one of the canonical JSON, the gzip header holding a timestamp
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if digest not in self.references or not os.path.exists(path):
+            payload = gzip.compress(data, compresslevel=6, mtime=0)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+        entry = {
+            'digest': digest,
+            'link': link,
+            'league': league,
+            'year': year,
+            'finished': finished,
+            'size': os.path.getsize(path),
+            'accessed': time.time()
+        }
+        self._add_reference(entry)
+        previous = self.index.get(str(match_id))
+        self.index[str(match_id)] = entry
+        if previous is not None:
+            self._drop_reference(previous)
+        self.evict()
+        self._changed()
+
+    ############################################################################
+    def evict(self):
+        """Removes the least recently used matches until the cache fits its size limit"""
+        if self.total_size <= self.max_bytes:
+            return
+        for match_id, entry in sorted(self.index.items(), key=lambda item: item[1]['accessed']):
+            if self.total_size <= self.max_bytes:
+                break
+            self._drop_reference(self.index.pop(match_id))
+            self.unsaved_count += 1
+            logging.info("Match %s evicted from the raw cache", match_id)
+
+    ############################################################################
+    def iter_matches(self, year, league, skip_ids=None, finished_only=False):
+        """
+        Read the cached matches of a season, without scraping.
+
+        Parameters:
+        - year (int): The season end year.
+        - league (string): The league name.
+        - skip_ids (set): The ids of the matches not to read.
+        - finished_only (bool): Only read the finished matches.
+
+        Yields:
+        - tuple: The (link, match_data) pair of each cached match.
+        """
+        skip_ids = skip_ids or set()
+        entries = [
+            (int(match_id), entry) for match_id, entry in self.index.items()
+            if entry['league'] == league and entry['year'] == year and int(match_id) not in skip_ids
+            and (entry['finished'] or not finished_only)
+        ]
+        for match_id, entry in entries:
+            match_data = self.get(match_id)
+            if match_data is not None:
+                yield entry['link'], match_data
+        self._save_index()
@@ -0,0 +1,250 @@
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
+from pyvirtualdisplay import Display
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.53 Safari/537.36'
+CHROME_DRIVER_PATH = '/usr/bin/chromedriver'
+
+# A driver is replaced after this many pages, or once its browser uses more memory than this
+DEFAULT_MAX_PAGES = 200
+DEFAULT_MAX_MEMORY_MB = 1536
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """
+    Exponential backoff with jitter.
+
+    Parameters:
+    - attempt (int): The number of failed attempts so far, starting at 1.
+    - base (float): The delay after the first failure, in seconds.
+    - cap (float): The maximum delay, in seconds.
+
+    Returns:
+    - float: The delay before the next attempt, in seconds.
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _process_tree_memory_mb(pid):
+    """Returns the resident memory of a process and its children from /proc, or None if it can't be read"""
+    total_kb = 0
+    pids = [pid]
+    try:
+        while pids:
+            current = pids.pop()
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        return None if total_kb == 0 else total_kb / 1024
+    return total_kb / 1024
+
+
+class DriverManager():
+    """
+    Keeps warm, pre-configured Chrome drivers sharing one virtual display.
+
+    Scrapers acquire a driver and give it back once done, so it is reused by the
+    next scraper instead of starting a new browser. A failing driver is first
+    recovered in place, by stopping the page and going back to a blank page, and
+    only restarted if it doesn't answer anymore. Drivers are recycled after
+    max_pages pages or once their browser uses more than max_memory_mb.
+    """
+
+    ############################################################################
+    def __init__(self, max_pages=DEFAULT_MAX_PAGES, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.display = None
+        self.idle_drivers = []
+        self.closed = False
+        self.lock = threading.Lock()
+        self.started_count = 0
+        self.recovered_count = 0
+        self.restarted_count = 0
+        self.recycled_count = 0
+
+    ############################################################################
+    def __enter__(self):
+        return self
+
+    ############################################################################
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    ############################################################################
+    def start_display(self):
+        """Starts the virtual display shared by the drivers, if it isn't started yet"""
+        with self.lock:
+            if self.display is None:
+                self.display = Display(visible=0, size=(1920, 1080))
+                self.display.start()
+
+    ############################################################################
+    def new_driver(self):
+        """Starts a Chrome driver"""
+        self.closed = False
+        self.start_display()
+        options = Options()
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        options.add_argument('window-size=1920,1080')
+        options.add_argument('--disable-blink-features=AutomationControlled')
+        options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        options.add_experimental_option('useAutomationExtension', False)
+
+        # proxy = get_proxy() # Use proxy
+        # options.add_argument('--proxy-server="http={};https={}"'.format(proxy, proxy))
+        prefs = {'profile.managed_default_content_settings.images': 2} # don't load images to make faster
+        options.add_experimental_option('prefs', prefs)
+
+        driver = webdriver.Chrome(service=Service(CHROME_DRIVER_PATH), options=options)
+        driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": USER_AGENT})
+        # Applied to every new document, so it survives the navigations
+        driver.execute_cdp_cmd(
+            'Page.addScriptToEvaluateOnNewDocument',
+            {'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"}
+        )
+        with self.lock:
+            self.started_count += 1
+        logging.info("Chrome driver started")
+        return driver
+
+    ############################################################################
+    def warm_up(self, count):
+        """Starts drivers in parallel until count drivers are idle"""
+        with self.lock:
+            missing = count - len(self.idle_drivers)
+        if missing <= 0:
+            return
+        self.start_display()
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            drivers = list(executor.map(lambda _: self.new_driver(), range(missing)))
+        with self.lock:
+            self.idle_drivers.extend(drivers)
+        logging.info("%s Chrome drivers warmed up", missing)
+
+    ############################################################################
+    def acquire(self):
+        """Returns an idle driver, or a new one if none is idle"""
+        with self.lock:
+            if self.idle_drivers:
+                return self.idle_drivers.pop()
+        return self.new_driver()
+
+    ############################################################################
+    def release(self, driver):
+        """Gives a driver back, it is kept warm for the next scraper if it still answers"""
+        if not self.closed and self.recover(driver, count=False):
+            with self.lock:
+                self.idle_drivers.append(driver)
+        else:
+            self.quit(driver)
+
+    ############################################################################
+    def quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning("Error closing Chrome driver: %s", e)
+
+    ############################################################################
+    def recover(self, driver, count=True):
+        """
+        Brings a driver back to a blank page, without restarting it.
+
+        Parameters:
+        - driver (WebDriver): The driver.
+        - count (bool): Count the recovery in the driver statistics.
+
+        Returns:
+        - bool: True if the driver answers again, False if it must be restarted.
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.execute_script('window.stop();')
+            driver.get('about:blank')
+        except WebDriverException as e:
+            logging.warning("Chrome driver could not be recovered: %s", e)
+            return False
+        if count:
+            with self.lock:
+                self.recovered_count += 1
+        return True
+
+    ############################################################################
+    def restart(self, driver):
+        """Replaces a driver that doesn't answer anymore, returns the new one"""
+        self.quit(driver)
+        with self.lock:
+            self.restarted_count += 1
+        logging.info("Chrome driver restarted")
+        return self.acquire()
+
+    ############################################################################
+    def memory_mb(self, driver):
+        """Returns the memory used by the browser of a driver, in MB, or None if it is unknown"""
+        process = getattr(driver.service, 'process', None)
+        return _process_tree_memory_mb(process.pid) if process is not None else None
+
+    ############################################################################
+    def should_recycle(self, driver, pages_count):
+        """Returns True if a driver loaded too many pages or uses too much memory"""
+        if self.max_pages and pages_count >= self.max_pages:
+            return True
+        if self.max_memory_mb:
+            memory_mb = self.memory_mb(driver)
+            return memory_mb is not None and memory_mb > self.max_memory_mb
+        return False
+
+    ############################################################################
+    def recycle(self, driver):
+        """Replaces a worn driver with a warm or new one, returns the new one"""
+        self.quit(driver)
+        with self.lock:
+            self.recycled_count += 1
+        logging.info("Chrome driver recycled")
+        return self.acquire()
+
+    ############################################################################
+    def stats(self):
+        """Returns the drivers lifecycle counters"""
+        return {
+            'started': self.started_count,
+            'recovered': self.recovered_count,
+            'restarted': self.restarted_count,
+            'recycled': self.recycled_count
+        }
+
+    ############################################################################
+    def close(self):
+        """Quits the idle drivers and stops the virtual display"""
+        with self.lock:
+            self.closed = True
+            drivers, self.idle_drivers = self.idle_drivers, []
+        for driver in drivers:
+            self.quit(driver)
+        if self.display is not None:
+            self.display.stop()
+            self.display = None
+        logging.info(
+            "Chrome drivers closed. Started: {started}, recovered: {recovered}, "
+            "restarted: {restarted}, recycled: {recycled}".format(**self.stats())
+        )
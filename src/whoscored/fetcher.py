@@ -0,0 +1,147 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from helper.metrics import metrics
+from .whoscored import USER_AGENT, parse_match_data
+
+CAPTCHA_STATUS_CODES = {403, 429}
+CAPTCHA_MARKERS = ('captcha-container', '_Incapsula_Resource', 'Request unsuccessful. Incapsula')
+
+
+def looks_like_captcha(status_code, html):
+    """
+    Check if a response is a bot challenge instead of the requested page.
+
+    Parameters:
+    - status_code (int): The HTTP status code.
+    - html (string): The response body.
+
+    Returns:
+    - bool: True if the response looks like a captcha or a bot block page.
+    """
+    return status_code in CAPTCHA_STATUS_CODES or any(marker in html for marker in CAPTCHA_MARKERS)
+
+
+class MatchFetcher():
+    """
+    Fetches match centre pages with plain HTTP requests.
+
+    Every thread gets its own keep-alive session, as a requests session is not
+    thread-safe, and the sessions reuse the cookies of a browser session. The
+    WhoScored driver is only used when a response lacks the match data or looks
+    like a captcha. The fetcher is shared by the workers of a pool, the
+    fallback browser is used by one worker at a time.
+    """
+
+    ############################################################################
+    def __init__(self, scraper, pool_size=10, timeout=20, session_factory=None):
+        self.scraper = scraper
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session_factory = session_factory or self._new_session
+        self.fallback_lock = threading.Lock()
+        self.fallback_count = 0
+        # The browser cookies, copied into a session when it is created or after they change
+        self.cookies_lock = threading.Lock()
+        self.cookies = []
+        self.cookies_version = 0
+        self.local = threading.local()
+        self.sessions = []
+        self.load_cookies()
+
+    ############################################################################
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9'
+        })
+        return session
+
+    ############################################################################
+    def load_cookies(self):
+        """Reads the cookies of the browser session, the HTTP sessions copy them before their next request"""
+        cookies = self.scraper.driver.get_cookies()
+        with self.cookies_lock:
+            self.cookies = cookies
+            self.cookies_version += 1
+
+    ############################################################################
+    @property
+    def session(self):
+        """Returns the HTTP session of the current thread, with the latest browser cookies"""
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.session_factory()
+            self.local.cookies_version = 0
+            with self.cookies_lock:
+                self.sessions.append(session)
+        if self.local.cookies_version != self.cookies_version:
+            with self.cookies_lock:
+                cookies, self.local.cookies_version = self.cookies, self.cookies_version
+            for cookie in cookies:
+                session.cookies.set(
+                    cookie['name'],
+                    cookie['value'],
+                    domain=cookie.get('domain'),
+                    path=cookie.get('path', '/')
+                )
+        return session
+
+    ############################################################################
+    def fetch_match(self, link):
+        """
+        Fetch the match data of a match page, with the browser as fallback.
+
+        Parameters:
+        - link (string): The match centre link.
+
+        Returns:
+        - dict: The match data, with the 'matchId' and 'matchCentreData' keys.
+        """
+        try:
+            response = self.session.get(link, timeout=self.timeout)
+            if not looks_like_captcha(response.status_code, response.text):
+                response.raise_for_status()
+                return parse_match_data(response.text)
+            logging.warning("Captcha or block page returned for %s", link)
+        except Exception as e:
+            logging.warning("HTTP fetch failed for %s: %s", link, e)
+
+        with self.fallback_lock:
+            logging.info("Falling back to the browser for %s", link)
+            self.fallback_count += 1
+            metrics.count('browser_fallbacks')
+            match_data = self.scraper.scrape_match(link)
+            # The browser may have gone through a challenge, its cookies are reused from now on
+            self.load_cookies()
+        return match_data
+
+    ############################################################################
+    def scrape_match_with_retries(self, link, max_tries=3):
+        """Same as WhoScored.scrape_match_with_retries, over HTTP"""
+        for try_count in range(1, max_tries + 1):
+            try:
+                logging.debug("Fetching %s (Attempt %d)", link, try_count)
+                return self.fetch_match(link)
+            except Exception as e:
+                logging.error("Error fetching match: %s", e)
+                metrics.count('retries')
+                if try_count == max_tries:
+                    logging.error('Failed to fetch match from %s', link)
+                else:
+                    with self.fallback_lock:
+                        self.scraper.recover()
+        return ''
+
+    ############################################################################
+    def close(self):
+        with self.cookies_lock:
+            sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            session.close()
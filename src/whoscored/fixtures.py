@@ -0,0 +1,175 @@
+import logging
+import re
+from datetime import datetime, timezone
+
+# Monthly fixtures feed of a stage, as requested by the calendar of the fixtures page
+FIXTURES_FEED_URL = 'https://www.whoscored.com/tournaments/{stage_id}/data/?d={month}&isAggregate=false'
+STAGE_ID_PATTERN = re.compile(r'/Stages/(\d+)')
+FINISHED_FIXTURE_STATUSES = {6, 'FT', 'AET', 'PEN', 'Finished'}
+SLUG_PATTERN = re.compile(r"[^A-Za-z0-9]+")
+
+FETCH_JSON_SCRIPT = """
+const done = arguments[arguments.length - 1];
+fetch(arguments[0], {credentials: 'include', headers: {'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json'}})
+    .then(response => response.ok ? response.json() : null)
+    .then(done)
+    .catch(() => done(null));
+"""
+
+
+def season_months(year, calendar_season=False):
+    """
+    List the months of a season, as used by the fixtures feed.
+
+    Parameters:
+    - year (int): The season end year.
+    - calendar_season (bool): True if the season runs over a calendar year.
+
+    Returns:
+    - list: The months, formatted as "YYYYMM".
+    """
+    if calendar_season:
+        return [f'{year}{month:02d}' for month in range(1, 13)]
+    return [f'{year - 1}{month:02d}' for month in range(7, 13)] + [f'{year}{month:02d}' for month in range(1, 7)]
+
+
+def _parse_kickoff(value):
+    if not value:
+        return None
+    try:
+        kickoff = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return kickoff if kickoff.tzinfo else kickoff.replace(tzinfo=timezone.utc)
+
+
+def _team_name(match, side):
+    team = match.get(f'{side}TeamName') or match.get(f'{side}Team')
+    if isinstance(team, dict):
+        team = team.get('name')
+    return team or ''
+
+
+def _iter_feed_matches(data):
+    """Walks the feed JSON and yields every object describing a match"""
+    if isinstance(data, dict):
+        if 'id' in data and ('homeTeamName' in data or 'homeTeamId' in data or 'homeTeam' in data):
+            yield data
+            return
+        for value in data.values():
+            yield from _iter_feed_matches(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _iter_feed_matches(value)
+
+
+def parse_fixtures_feed(data, league_slug, year, calendar_season=False, now=None):
+    """
+    Extract the fixtures from a fixtures feed response.
+
+    Parameters:
+    - data (dict): The feed JSON.
+    - league_slug (string): The league part of the match links (ex: "England-Premier-League").
+    - year (int): The season end year.
+    - calendar_season (bool): True if the season runs over a calendar year.
+    - now (datetime): The current UTC time, to tell the started matches.
+
+    Returns:
+    - dict: The {match_id: fixture} dictionary, a fixture having the 'match_id', 'link',
+      'home', 'away', 'kickoff', 'status', 'started' and 'finished' keys.
+    """
+    now = now or datetime.now(timezone.utc)
+    # Same season part as the links of the fixtures page, the game name is read after it
+    season = str(year) if calendar_season else f'{year - 1}-{year}'
+    fixtures = {}
+    for match in _iter_feed_matches(data):
+        match_id = int(match['id'])
+        home, away = _team_name(match, 'home'), _team_name(match, 'away')
+        kickoff = _parse_kickoff(match.get('startTimeUtc') or match.get('startTime'))
+        status = match.get('status', match.get('matchStatus'))
+        game_slug = SLUG_PATTERN.sub('-', f'{home} {away}').strip('-')
+        finished = status in FINISHED_FIXTURE_STATUSES or match.get('elapsed') in FINISHED_FIXTURE_STATUSES
+        fixtures[match_id] = {
+            'match_id': match_id,
+            'link': f'https://www.whoscored.com/Matches/{match_id}/Live/{league_slug}-{season}-{game_slug}',
+            'home': home,
+            'away': away,
+            'kickoff': kickoff.isoformat() if kickoff else None,
+            'status': status,
+            'started': finished or (kickoff is not None and kickoff <= now),
+            'finished': finished
+        }
+    return fixtures
+
+
+def select_fixture_links(fixtures, skip_ids=None, now=None):
+    """
+    Pick the fixtures to scrape, from their status and kick-off time.
+
+    The finished matches already processed are skipped, and so are the matches
+    which haven't kicked off yet. The other ones are scraped: the new finished
+    matches, and the unfinished ones which kicked off, to get their latest events.
+
+    Parameters:
+    - fixtures (dict): The {match_id: fixture} dictionary of discover_fixtures.
+    - skip_ids (set): The ids of the finished matches already processed.
+    - now (datetime): The current UTC time, the kick-off times are compared to it.
+
+    Returns:
+    - dict: The {link: ''} dictionary of the matches to scrape.
+    """
+    now = now or datetime.now(timezone.utc)
+    skip_ids = skip_ids or set()
+    links = {}
+    processed_count = upcoming_count = unfinished_count = 0
+    for match_id, fixture in fixtures.items():
+        kickoff = _parse_kickoff(fixture['kickoff'])
+        if match_id in skip_ids:
+            processed_count += 1
+        elif not fixture['finished'] and (kickoff is None or kickoff > now):
+            upcoming_count += 1
+        else:
+            unfinished_count += not fixture['finished']
+            links[fixture['link']] = ''
+    logging.info(
+        "Fixtures feed: %d matches to scrape (%d unfinished), %d finished ones already processed, %d not started",
+        len(links), unfinished_count, processed_count, upcoming_count
+    )
+    return links
+
+
+def discover_fixtures(driver, stage_urls, year, league_slug, calendar_season=False, timeout=30):
+    """
+    Get the fixtures of a whole season from the fixtures feed, without clicking through the weeks.
+
+    The feed is requested from the page with fetch, so the browser cookies are sent along.
+
+    Parameters:
+    - driver (WebDriver): The driver, on a WhoScored page.
+    - stage_urls (list): The URLs of the stages of the season.
+    - year (int): The season end year.
+    - league_slug (string): The league part of the match links.
+    - calendar_season (bool): True if the season runs over a calendar year.
+    - timeout (int): The timeout of each feed request, in seconds.
+
+    Returns:
+    - dict: The {match_id: fixture} dictionary, empty if the feed could not be read.
+    """
+    driver.set_script_timeout(timeout)
+    fixtures = {}
+    for stage_url in stage_urls:
+        found = STAGE_ID_PATTERN.search(stage_url)
+        if not found:
+            logging.warning("No stage id in %s", stage_url)
+            continue
+        for month in season_months(year, calendar_season):
+            url = FIXTURES_FEED_URL.format(stage_id=found.group(1), month=month)
+            try:
+                data = driver.execute_async_script(FETCH_JSON_SCRIPT, url)
+            except Exception as e:
+                logging.warning("Error requesting the fixtures feed %s: %s", url, e)
+                data = None
+            if data:
+                fixtures.update(parse_fixtures_feed(data, league_slug, year, calendar_season))
+    logging.info("Fixtures found in the feed: %s", len(fixtures))
+    return fixtures
@@ -0,0 +1,188 @@
+import logging
+import queue
+import threading
+from .whoscored import WhoScored, filter_match_links
+from .fetcher import MatchFetcher
+from .drivers import DriverManager
+
+# Politeness cap: never hit WhoScored with more browsers than this at once
+MAX_WORKERS = 8
+
+
+class WhoScoredPool():
+    """
+    Pool of WhoScored scrapers, each one with its own driver and virtual display.
+
+    The match links of a season are shared between the workers through a queue,
+    so a slow or restarting worker never blocks the other ones.
+
+    With http_fetch, a single browser is started: the workers fetch the match
+    pages over HTTP and only use the browser as a fallback.
+
+    The browsers come from a drivers manager: they are warmed up in parallel and
+    given back to the manager when the pool is closed, so another pool sharing
+    the manager reuses them.
+    """
+
+    ############################################################################
+    def __init__(self, workers=2, max_tries=3, http_fetch=False, drivers=None):
+        self.workers = max(1, min(int(workers), MAX_WORKERS))
+        self.max_tries = max_tries
+        self.http_fetch = http_fetch
+        self.owns_drivers = drivers is None
+        self.drivers = drivers if drivers is not None else DriverManager()
+        self.scrapers = []
+        self.fetcher = None
+        if self.workers < int(workers):
+            logging.warning("%s workers requested, capped to %s", workers, self.workers)
+
+    ############################################################################
+    def start(self):
+        """Starts the missing scrapers of the pool"""
+        browsers_count = 1 if self.http_fetch else self.workers
+        self.drivers.warm_up(browsers_count - len(self.scrapers))
+        while len(self.scrapers) < browsers_count:
+            self.scrapers.append(WhoScored(drivers=self.drivers))
+        if self.http_fetch and self.fetcher is None:
+            self.fetcher = MatchFetcher(self.scrapers[0], pool_size=self.workers)
+        logging.info("WhoScored pool started with %s workers and %s browsers", self.workers, len(self.scrapers))
+
+    ############################################################################
+    def get_workers(self):
+        """Returns the objects scraping the links, one per worker thread"""
+        if self.http_fetch:
+            return [self.fetcher] * self.workers
+        return self.scrapers
+
+    ############################################################################
+    def close(self):
+        logging.info("Closing WhoScored pool")
+        if self.fetcher is not None:
+            self.fetcher.close()
+            self.fetcher = None
+        for scraper in self.scrapers:
+            try:
+                scraper.close()
+            except Exception as e:
+                logging.error("Error closing scraper: %s", e)
+        self.scrapers = []
+        if self.owns_drivers:
+            self.drivers.close()
+
+    ############################################################################
+    def get_match_links(self, year, league, skip_ids=None):
+        self.start()
+        return self.scrapers[0].get_match_links(year, league, skip_ids)
+
+    ############################################################################
+    def _work(self, scraper, links_queue, results_queue, stop_event):
+        """Scrapes links from the queue until it is empty or the pool is stopped"""
+        try:
+            while not stop_event.is_set():
+                try:
+                    link = links_queue.get_nowait()
+                except queue.Empty:
+                    break
+                data = ''
+                try:
+                    data = scraper.scrape_match_with_retries(link, self.max_tries)
+                finally:
+                    results_queue.put((link, data))
+        except Exception as e:
+            logging.error("WhoScored worker stopped: %s", e)
+        finally:
+            results_queue.put(None)
+
+    ############################################################################
+    def iter_match_links(self, match_links):
+        """
+        Scrape the given match links with every worker of the pool.
+
+        Parameters:
+        - match_links (dict): The {link: match_data} dictionary, links with '' are scraped.
+
+        Yields:
+        - tuple: The (link, match_data) pair in completion order, match_data is ''
+          if every attempt failed.
+        """
+        links_queue = queue.Queue()
+        for link, data in match_links.items():
+            if data == '':
+                links_queue.put(link)
+        total = links_queue.qsize()
+        if total == 0:
+            return
+
+        self.start()
+        if self.fetcher is not None:
+            # The fetcher is built before the browser loads any page, the cookies of the
+            # consent banner and of the bot checks are only there once the links are scraped
+            self.fetcher.load_cookies()
+        results_queue = queue.Queue()
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(scraper, links_queue, results_queue, stop_event),
+                daemon=True
+            )
+            for scraper in self.get_workers()[:total]
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            running = len(threads)
+            done = 0
+            while running:
+                result = results_queue.get()
+                if result is None:
+                    running -= 1
+                    continue
+                done += 1
+                logging.debug("Scraped match %d/%d", done, total)
+                yield result
+
+            # Links left behind by workers that died
+            while True:
+                try:
+                    yield links_queue.get_nowait(), ''
+                except queue.Empty:
+                    break
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    ############################################################################
+    def iter_matches(self, year, league, skip_ids=None):
+        """Same as WhoScored.iter_matches, with the links split between the workers"""
+        logging.info("Starting to stream matches for %s %s", league, year)
+
+        match_links = self.get_match_links(year, league, skip_ids)
+        if match_links == -1:
+            logging.error("Failed to get match links for %s %s", league, year)
+            return
+
+        logging.info("Total matches found for %s %s: %s", league, year, len(match_links))
+        match_links = filter_match_links(match_links, skip_ids)
+
+        for link, data in self.iter_match_links(match_links):
+            if data != '':
+                yield link, data
+
+    ############################################################################
+    def scrape_matches(self, year, league):
+        """Same as WhoScored.scrape_matches, with the links split between the workers"""
+        logging.info("Starting to scrape matches for %s %s", league, year)
+
+        match_data = self.get_match_links(year, league)
+        if match_data == -1:
+            return -1
+
+        logging.info("Total matches found for %s %s: %s", league, year, len(match_data))
+
+        for link, data in self.iter_match_links(match_data):
+            match_data[link] = data
+
+        return match_data
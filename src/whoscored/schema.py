@@ -0,0 +1,93 @@
+import pandas as pd
+from helper.qualifiers import COMMON_QUALIFIERS
+
+# Columns holding the same value on every row of a match, kept in the game info instead
+GAME_COLUMNS = ["game", "score", "date", "league"]
+
+# dtypes of the processed events columns, the q_* flags are booleans
+EVENTS_SCHEMA = {
+    "game": "category",
+    "game_id": "int32",
+    "score": "category",
+    "event_id": "int64",
+    "period_id": "int8",
+    "team_id": "Int32",
+    "player_id": "Int32",
+    "player_name": "category",
+    "type_id": "Int16",
+    "date": "category",
+    "minute": "Int16",
+    "second": "Int8",
+    "outcome": "bool",
+    "x": "float32",
+    "y": "float32",
+    "end_x": "float32",
+    "end_y": "float32",
+    "touch": "bool",
+    "shot": "bool",
+    "goal": "bool",
+    "type_name": "category",
+    "league": "category",
+    "team_name": "category",
+    "h_a": "category",
+    "cardType": "category",
+    "xT_added": "float32",
+    **{f"q_{name}": "bool" for name in COMMON_QUALIFIERS}
+}
+
+
+def apply_schema(events_df, schema=EVENTS_SCHEMA):
+    """
+    Cast the columns of a processed events DataFrame to their compact dtype.
+
+    Parameters:
+    - events_df (DataFrame): The processed events.
+    - schema (dict): The {column: dtype} dictionary, the columns missing from it are kept as they are.
+
+    Returns:
+    - DataFrame: The events, with the columns of the schema cast.
+    """
+    dtypes = {
+        column: dtype for column, dtype in schema.items()
+        if column in events_df.columns and str(events_df[column].dtype) != dtype
+    }
+    return events_df.astype(dtypes) if dtypes else events_df
+
+
+def split_game_columns(events_df, columns=GAME_COLUMNS):
+    """
+    Move the match constants out of the events.
+
+    Parameters:
+    - events_df (DataFrame): The processed events.
+    - columns (list): The columns with one value per match.
+
+    Returns:
+    - tuple: The (events_df, game_columns) pair, the events without the constant
+      columns and the {column: value} dictionary of their values.
+    """
+    columns = [column for column in columns if column in events_df.columns]
+    game_columns = {}
+    for column in columns:
+        value = events_df[column].iloc[0] if len(events_df) else None
+        game_columns[column] = None if pd.isna(value) else str(value)
+    return events_df.drop(columns=columns), game_columns
+
+
+def with_game_columns(events_df, game_info, columns=GAME_COLUMNS):
+    """
+    Add the match constants back to the events, for the readers expecting them on every row.
+
+    Parameters:
+    - events_df (DataFrame): The events, as stored in Redis.
+    - game_info (dict or Series): The game info of the match, as stored in the games index.
+    - columns (list): The constant columns to add.
+
+    Returns:
+    - DataFrame: A copy of the events with the constant columns, as categoricals.
+    """
+    events_df = events_df.copy()
+    for column in columns:
+        if column in game_info and column not in events_df.columns:
+            events_df[column] = pd.Categorical([game_info[column]] * len(events_df))
+    return events_df
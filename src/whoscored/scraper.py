@@ -3,8 +3,98 @@ import pandas as pd
 import json
 import numpy as np
 from .whoscored import WhoScored
+from .pool import WhoScoredPool
+from helper.qualifiers import parse_qualifiers, flatten_qualifiers, qualifier_flags
+from helper.resolver import get_club_resolver
+from helper.metrics import metrics
+from helper.xt import get_xt_model
+from .schema import apply_schema, split_game_columns
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+FINISHED_STATUSES = {"FT", "AET", "PEN"}
+
+def is_match_finished(match_centre_data):
+    """
+    Check if a match is over, so that its data will not change anymore.
+
+    Parameters:
+    - match_centre_data (dict): The matchCentreData dictionary of the match.
+
+    Returns:
+    - bool: True if the match is finished.
+    """
+    return match_centre_data.get("elapsed") in FINISHED_STATUSES or bool(match_centre_data.get("ftScore"))
+
+def extract_events_columns(events, player_names):
+    """
+    Extract the events of a match into typed columns, in a single pass.
+
+    Parameters:
+    - events (list): The matchCentreData events.
+    - player_names (dict): The playerIdNameDictionary of the match.
+
+    Returns:
+    - dict: The {column: array} dictionary of the event fields.
+    """
+    n = len(events)
+    event_id = np.empty(n, dtype=np.int64)
+    period_id = np.empty(n, dtype=np.int8)
+    start_x = np.empty(n, dtype=np.float32)
+    start_y = np.empty(n, dtype=np.float32)
+    end_x = np.empty(n, dtype=np.float32)
+    end_y = np.empty(n, dtype=np.float32)
+    outcome = np.empty(n, dtype=bool)
+    touch = np.empty(n, dtype=bool)
+    shot = np.empty(n, dtype=bool)
+    goal = np.empty(n, dtype=bool)
+    team_id = [None] * n
+    minute = [None] * n
+    player_id = [None] * n
+    player_name = [None] * n
+    type_id = [None] * n
+    second = [None] * n
+    qualifiers = [None] * n
+    type_name = [None] * n
+
+    for i, event in enumerate(events):
+        event_id[i] = event.get("id")
+        period_id[i] = event["period"].get("value")
+        team_id[i] = event.get("teamId")
+        minute[i] = event.get("minute")
+        start_x[i] = event.get("x", np.nan)
+        start_y[i] = event.get("y", np.nan)
+        end_x[i] = event.get("endX", np.nan)
+        end_y[i] = event.get("endY", np.nan)
+        outcome[i] = event.get("outcomeType", {}).get("value") == 1
+        touch[i] = bool(event.get("isTouch"))
+        shot[i] = event.get("isShot", False)
+        goal[i] = event.get("isGoal", False)
+        player_id[i] = event.get("playerId")
+        player_name[i] = player_names.get(str(player_id[i]))
+        type_id[i] = event.get("eventId")
+        second[i] = event.get("second")
+        qualifiers[i] = event.get("qualifiers")
+        type_name[i] = event["type"].get("displayName")
+
+    return {
+        "event_id": event_id,
+        "period_id": period_id,
+        "team_id": pd.array(team_id, dtype="Int32"),
+        "player_id": pd.array(player_id, dtype="Int32"),
+        "player_name": player_name,
+        "type_id": pd.array(type_id, dtype="Int16"),
+        "minute": pd.array(minute, dtype="Int16"),
+        "second": pd.array(second, dtype="Int8"),
+        "outcome": outcome,
+        "start_x": start_x,
+        "start_y": start_y,
+        "end_x": end_x,
+        "end_y": end_y,
+        "qualifiers": qualifiers,
+        "touch": touch,
+        "shot": shot,
+        "goal": goal,
+        "type_name": pd.Categorical(type_name)
+    }
 
 def process_match_data(match_key, match_data, league):
     """Processes match data and returns the necessary information"""
@@ -14,163 +104,220 @@ def process_match_data(match_key, match_data, league):
         elif isinstance(match_data, dict):
             match = match_data
         else:
-            logging.warning(f"Unexpected type of data for {match_key}: {type(match_data)}")
+            logging.warning("Unexpected type of data for %s: %s", match_key, type(match_data))
             return None
 
         game = match_key.split("2025-")[1]
         game_id = match["matchId"]
         
-        events_data = []
         playerIdNameDictionary = match["matchCentreData"].get("playerIdNameDictionary", {})
         date = match["matchCentreData"].get("startDate")
         score = match["matchCentreData"].get("score")
 
-        for event in match["matchCentreData"].get("events", []):
-            event_data = {
-                "game": game,
-                "game_id": game_id,
-                "score": score,
-                "event_id": event.get("id"),
-                "period_id": event["period"].get("value"),
-                "team_id": event.get("teamId"),
-                "player_id": event.get("playerId"),
-                "player_name": playerIdNameDictionary.get(str(event.get("playerId"))),
-                "type_id": event.get("eventId"),
-                "date": date,
-                "minute": event.get("minute"),
-                "second": event.get("second"),
-                "outcome": event.get("outcomeType", {}).get("value") == 1,
-                "start_x": event.get("x"),
-                "start_y": event.get("y"),
-                "end_x": event.get("endX"),
-                "end_y": event.get("endY"),
-                "qualifiers": event.get("qualifiers"),
-                "touch": event.get("isTouch"),
-                "shot": event.get("isShot", False),
-                "goal": event.get("isGoal", False),
-                "type_name": event["type"].get("displayName")
-            }
-            events_data.append(event_data)
+        events_df = pd.DataFrame(extract_events_columns(
+            match["matchCentreData"].get("events", []),
+            playerIdNameDictionary
+        ))
+        events_df.insert(0, "game", game)
+        events_df.insert(1, "game_id", game_id)
+        events_df.insert(2, "score", score)
+        events_df.insert(9, "date", date)
 
         return {
-            'events_df': pd.DataFrame(events_data),
+            'events_df': events_df,
             'game_info': {
                 'game_id': game_id,
                 'game': game,
-                'league': league
+                'league': league,
+                'finished': is_match_finished(match["matchCentreData"])
             }
         }
 
     except Exception as e:
-        logging.error(f"Error when processing the match {match_key}: {str(e)}")
+        logging.error("Error when processing the match %s: %s", match_key, e)
         return None
 
-def get_matches_data(year=2025):
-    """Retrieves data for all matches in a given season"""
-    scraper = WhoScored()
-    all_matches_data = []
-    games_info = []
-    
-    # leagues = ["Champions League", "Bundesliga", "EPL", "La Liga", "Ligue 1", "Serie A"]
-    leagues = ["Bundesliga", "EPL", "La Liga", "Ligue 1", "Serie A"]
-    
+LEAGUES = ["Bundesliga", "EPL", "La Liga", "Ligue 1", "Serie A"]
+# LEAGUES = ["Champions League", "Bundesliga", "EPL", "La Liga", "Ligue 1", "Serie A"]
+
+def iter_raw_matches(scraper, year, league, skip_ids=None, cache=None):
+    """
+    Yields the raw data of the matches of a league, from the cache when possible.
+
+    Parameters:
+    - scraper (WhoScored): The scraper, or None to only read the cache.
+    - year (int): The season end year.
+    - league (string): The league name.
+    - skip_ids (set): The ids of the matches not to yield.
+    - cache (RawMatchCache): The raw match cache, or None.
+
+    Yields:
+    - tuple: The (link, match_data) pair of each match.
+    """
+    skip_ids = set(skip_ids or ())
+
+    if cache is not None:
+        # Offline, every cached match is read, else only the finished ones
+        for link, match_data in cache.iter_matches(year, league, skip_ids, finished_only=scraper is not None):
+            metrics.count('cache_hits', league=league)
+            yield link, match_data
+        skip_ids |= cache.fresh_ids()
+
+    if scraper is None:
+        return
+
+    scraped_matches = scraper.iter_matches(year, league, skip_ids)
+    try:
+        while True:
+            # Only the scraping is timed, not the consumer of the matches
+            with metrics.timer('scrape', league):
+                link, match_data = next(scraped_matches, (None, None))
+            if link is None:
+                break
+            metrics.count('pages', league=league)
+            if cache is not None:
+                cache.put(
+                    match_data["matchId"],
+                    link,
+                    league,
+                    year,
+                    match_data,
+                    is_match_finished(match_data["matchCentreData"])
+                )
+            yield link, match_data
+    finally:
+        # The index of the cache is written once per league
+        if cache is not None:
+            cache.flush()
+
+def iter_season_matches(year=2025, leagues=LEAGUES, workers=1, skip_ids=None, http_fetch=False, cache=None, offline=False, drivers=None):
+    """
+    Streams the raw data of every match in a given season.
+
+    Parameters:
+    - year (int): The season end year.
+    - leagues (list): The leagues to scrape.
+    - workers (int): The number of browsers scraping the match pages in parallel.
+    - skip_ids (set): The ids of the matches already processed, which are not scraped again.
+    - http_fetch (bool): Fetch the match pages over HTTP, with the browser as fallback.
+    - cache (RawMatchCache): The raw match cache, the finished matches it holds are not scraped again.
+    - offline (bool): Only read the matches from the cache, without starting any browser.
+    - drivers (DriverManager): The manager of the Chrome drivers, kept warm between calls. A private one is used if None.
+
+    Yields:
+    - tuple: The (match_key, match_data, league) triple of each match.
+    """
+    if offline and cache is None:
+        raise ValueError("The offline mode needs a raw match cache")
+
+    if offline:
+        scraper = None
+    elif workers > 1 or http_fetch:
+        scraper = WhoScoredPool(workers, http_fetch=http_fetch, drivers=drivers)
+    else:
+        scraper = WhoScored(drivers=drivers)
+
     try:
         for league in leagues:
-            logging.info(f'Scraping {league} data in {year}')
-            result = scraper.scrape_matches(year, league)
-            
-            if isinstance(result, dict):
-                logging.info(f'Data collected {league} {year}. Games found: {len(result)}')
-                
-                for match_key, match_data in result.items():
-                    processed_data = process_match_data(match_key, match_data, league)
-                    if processed_data:
-                        all_matches_data.append(processed_data['events_df'])
-                        games_info.append(processed_data['game_info'])
-            else:
-                logging.error(f'Error when scraping {league} {year}')
-                
+            logging.info('Scraping %s data in %s', league, year)
+            games_count = 0
+
+            for match_key, match_data in iter_raw_matches(scraper, year, league, skip_ids, cache):
+                games_count += 1
+                yield match_key, match_data, league
+
+            logging.info('Data collected %s %s. Games found: %s', league, year, games_count)
+
     except Exception as e:
-        logging.error(f"Error when scraping: {str(e)}")
+        logging.error("Error when scraping: %s", e)
     finally:
-        scraper.close()
-        
+        if scraper is not None:
+            scraper.close()
+
+def iter_matches_data(year=2025, leagues=LEAGUES, workers=1, skip_ids=None, http_fetch=False, cache=None, offline=False, drivers=None):
+    """
+    Streams the data of every match in a given season.
+
+    Each match is scraped and processed right before being yielded, so only one
+    match is held in memory at a time. The parameters are the ones of iter_season_matches.
+
+    Yields:
+    - dict: The processed match data, with the 'events_df' and 'game_info' keys.
+    """
+    for match_key, match_data, league in iter_season_matches(year, leagues, workers, skip_ids, http_fetch, cache, offline, drivers):
+        processed_data = process_match_data(match_key, match_data, league)
+        if processed_data:
+            yield processed_data
+
+def parse_raw_match(match_key, match_data, league):
+    """
+    Processes a raw match, the parse stage of the pipeline.
+
+    Returns:
+    - tuple: The (processed_data, league) pair, or None if the match could not be processed.
+    """
+    with metrics.timer('parse', league):
+        processed_data = process_match_data(match_key, match_data, league)
+    if not processed_data:
+        metrics.count('failed_matches', league=league)
+        return None
+    metrics.count('matches', league=league)
+    return processed_data, league
+
+def preprocess_match(processed_data, league, clubs_list, clubs_ids, xt_model=None):
+    """
+    Preprocesses a processed match, the preprocess stage of the pipeline.
+
+    Returns:
+    - tuple: The (game_info, processed_df) pair, or None if the match has no events yet. The game
+      info holds the match constants (game, score, date, league), which are not repeated in processed_df.
+    """
+    if processed_data['events_df'].empty:
+        # A match just kicked off, it is scraped again next run as it isn't finished
+        logging.info("No events yet for the match %s, skipped", processed_data['game_info']['game_id'])
+        metrics.count('empty_matches', league=league)
+        return None
+    with metrics.timer('preprocess', league):
+        processed_df = preprocess_events_df(processed_data['events_df'], league, clubs_list, clubs_ids, xt_model)
+    metrics.count('events', len(processed_df), league=league)
+    # The match constants are stored once in the game info, not on every event
+    processed_df, game_columns = split_game_columns(processed_df)
+    game_info = processed_data['game_info']
+    game_info.update(game_columns)
+    return game_info, processed_df
+
+def get_matches_data(year=2025, leagues=LEAGUES, workers=1, cache=None, offline=False):
+    """Retrieves data for all matches in a given season"""
+    all_matches_data = []
+    games_info = []
+
+    for processed_data in iter_matches_data(year, leagues, workers, cache=cache, offline=offline):
+        all_matches_data.append(processed_data['events_df'])
+        games_info.append(processed_data['game_info'])
+
     return {
         'matches_data': all_matches_data,
         'games_info': pd.DataFrame(games_info)
     }
 
-def preprocess_events_df(events_df, league, clubs_list, clubs_ids):
+def preprocess_events_df(events_df, league, clubs_list, clubs_ids, xt_model=None):
     """
     Applique le preprocessing aux données d'événements d'un match.
+    Le xT est calculé avec xt_model, ou la grille par défaut du processus si None.
     """
-    def find_clubs(ws_name, clubs_list):
-        """
-        Find the two clubs names in a single string.
-        Parameters:
-        - ws_name (string): The game string (ex: "paris-saint-germain-clermont-foot").
-        - clubs_list (string): The clubs list referential.
-        Returns:
-        - list: The list with the two clubs in the right order.
-        """
-        ws_name = ws_name.replace(" ", "-")
-        
-        found_clubs = []
-        for club in clubs_list:
-            if club.lower() in ws_name.lower():
-                found_clubs.append(club)
-        
-        return found_clubs
-
-    def check_card_type(qualifiers):
-        """
-        Check the card type from the event.
-
-        Parameters:
-        - qualifiers (list): The dictionary list of qualifiers
-
-        Returns:
-        - string: A value between "Red", "Second Yellow", "Yellow" or None.
-        """
-        display_names = []
-        for i in range (0, len(qualifiers)):
-            display_names.append(qualifiers[i]["type"]["displayName"])
-        if "Red" in display_names:
-            return "Red"
-        elif "SecondYellow" in display_names:
-            return "SecondYellow"
-        elif "Yellow" in display_names:
-            return "Yellow"
-        else:
-            return None
-
-    def calculate_expected_threat(row):
-        """
-        Calculate the "Expected Threat" metric for a pass (based only from the distance to the opponent goal, not the xT matrix).
-
-        Parameters:
-        - row (dict): The pass event dictionary from the dataframe.
-
-        Returns:
-        - float: The xT value, between 0 and 1.
-        """
-        if row['type_name'] == 'Pass':
-            # provisional calculation
-            distance_to_goal = np.sqrt((100 - row['start_x'])**2 + (50 - row['start_y'])**2)
-            expected_threat = np.exp(-0.1 * distance_to_goal)
-        else:
-            expected_threat = 0
-        return expected_threat
-
+    original_game_name = events_df["game"].iloc[0] if len(events_df) and "game" in events_df.columns else None
+    if events_df.empty:
+        logging.warning("No events to preprocess for %s", original_game_name)
+        return events_df
     try:
         events_df["league"] = league.replace("_", " ")
-        original_game_name = events_df.loc[0, "game"]
         
         try:
-            clubs = find_clubs(original_game_name, clubs_list)
+            resolver = get_club_resolver(clubs_list, clubs_ids)
+            clubs = resolver.find_clubs(original_game_name)
             
             if len(clubs) != 2:
-                logging.warning(f"Found {len(clubs)} clubs in '{original_game_name}', trying direct split")
+                logging.warning("Found %s clubs in '%s', trying direct split", len(clubs), original_game_name)
                 clubs = original_game_name.split(" - ")
             
             if len(clubs) == 2:
@@ -178,39 +325,57 @@ def preprocess_events_df(events_df, league, clubs_list, clubs_ids):
                 new_game_name = f"{home_team} - {away_team}"
                 events_df["game"] = new_game_name
 
-                team_ids = {value: key for key, value in clubs_ids.items()}
-                events_df["team_name"] = events_df["team_id"].apply(
-                    lambda x: team_ids.get(x, f"Team_{x}")
-                )
+                team_names = events_df["team_id"].map(resolver.id_to_name)
+                # The events without team keep no team name and no side
+                no_team = events_df["team_id"].isna().to_numpy()
+                unknown_teams = team_names.isna() & ~no_team
+                if unknown_teams.any():
+                    team_names = team_names.where(~unknown_teams, "Team_" + events_df["team_id"].astype(str))
+                events_df["team_name"] = team_names
                 
-                events_df["h_a"] = events_df["team_name"].apply(
-                    lambda x: 'h' if x == home_team else 'a'
-                )
+                events_df["h_a"] = np.where(no_team, None, np.where(team_names == home_team, 'h', 'a'))
             else:
-                logging.warning(f"Could not process team names for {original_game_name}, keeping original data")
+                logging.warning("Could not process team names for %s, keeping original data", original_game_name)
 
         except Exception as e:
-            logging.warning(f"Error in team processing for {original_game_name}: {str(e)}")
+            logging.warning("Error in team processing for %s: %s", original_game_name, e)
 
         try:
-            events_df["qualifiers"] = events_df["qualifiers"].apply(
-                lambda x: eval(x) if isinstance(x, str) else x
-            )
-            events_df['cardType'] = events_df.apply(
-                lambda row: check_card_type(row['qualifiers']) if row['type_name'] == 'Card' else None,
-                axis=1
+            events_df["qualifiers"] = events_df["qualifiers"].map(parse_qualifiers)
+
+            # The qualifiers are flattened once, then looked up as boolean columns
+            qualifiers_df = flatten_qualifiers(events_df["qualifiers"])
+            flags_df = pd.DataFrame(qualifier_flags(qualifiers_df, len(events_df)), index=events_df.index)
+            events_df = pd.concat([events_df, flags_df], axis=1)
+
+            is_card = (events_df['type_name'] == 'Card').to_numpy()
+            card_types = np.select(
+                [is_card & events_df['q_Red'].to_numpy(),
+                 is_card & events_df['q_SecondYellow'].to_numpy(),
+                 is_card & events_df['q_Yellow'].to_numpy()],
+                [np.array("Red", dtype=object), np.array("SecondYellow", dtype=object), np.array("Yellow", dtype=object)],
+                default=None
             )
+            events_df['cardType'] = pd.Series(card_types, index=events_df.index)
         except Exception as e:
-            logging.warning(f"Error in qualifiers processing: {str(e)}")
+            logging.warning("Error in qualifiers processing: %s", e)
 
         try:
-            events_df['xT_added'] = events_df.apply(calculate_expected_threat, axis=1)
+            events_df['xT_added'] = (xt_model or get_xt_model()).added(
+                events_df['type_name'].to_numpy(dtype=object),
+                events_df['outcome'].to_numpy(),
+                events_df['start_x'].to_numpy(),
+                events_df['start_y'].to_numpy(),
+                events_df['end_x'].to_numpy(),
+                events_df['end_y'].to_numpy()
+            )
             events_df = events_df.rename(columns={'start_x': 'x', 'start_y': 'y'})
         except Exception as e:
-            logging.warning(f"Error in xT calculation: {str(e)}")
+            logging.warning("Error in xT calculation: %s", e)
 
-        return events_df
+        # Repeated strings as categoricals, ids and coordinates on the smallest dtype holding them
+        return apply_schema(events_df)
 
     except Exception as e:
-        logging.error(f"Critical error in preprocessing for {original_game_name}: {str(e)}")
+        logging.error("Critical error in preprocessing for %s: %s", original_game_name, e)
         return events_df
\ No newline at end of file
@@ -1,48 +1,137 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from pyvirtualdisplay import Display
-import time
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 # from IPython.display import clear_output
 # from shared_functions import *
 import json
+import time
 import os
+import re
 import pandas as pd
+import numpy as np
 import logging
+from helper.qualifiers import flatten_qualifiers
+from helper.metrics import metrics
+from .fixtures import discover_fixtures, select_fixture_links
+from .drivers import DriverManager, USER_AGENT, backoff_delay
+
+# Seconds to wait for a page condition before giving up
+DEFAULT_WAIT_TIMEOUT = 10
+SEASON_LINK_MAX_TRIES = 5
+
+LEAGUE_LINKS = {
+    'EPL': 'https://www.whoscored.com/Regions/252/Tournaments/2/England-Premier-League',
+    'La Liga': 'https://www.whoscored.com/Regions/206/Tournaments/4/Spain-LaLiga',
+    'Bundesliga': 'https://www.whoscored.com/Regions/81/Tournaments/3/Germany-Bundesliga',
+    'Serie A': 'https://www.whoscored.com/Regions/108/Tournaments/5/Italy-Serie-A',
+    'Ligue 1': 'https://www.whoscored.com/Regions/74/Tournaments/22/France-Ligue-1',
+    'Argentina Liga Profesional': 'https://www.whoscored.com/Regions/11/Tournaments/68/Argentina-Liga-Profesional',
+    'EFL Championship': 'https://www.whoscored.com/Regions/252/Tournaments/7/England-Championship',
+    'EFL1': 'https://www.whoscored.com/Regions/252/Tournaments/8/England-League-One',
+    'EFL2': 'https://www.whoscored.com/Regions/252/Tournaments/9/England-League-Two',
+    # Edd Webster added these leagues (twitter: https://twitter.com/eddwebster)
+    'Liga Nos': 'https://www.whoscored.com/Regions/177/Tournaments/21/Portugal-Liga-NOS',
+    'Eredivisie': 'https://www.whoscored.com/Regions/155/Tournaments/13/Netherlands-Eredivisie',
+    'Russian Premier League': 'https://www.whoscored.com/Regions/182/Tournaments/77/Russia-Premier-League',
+    'Brasileirao': 'https://www.whoscored.com/Regions/31/Tournaments/95/Brazil-Brasileir%C3%A3o',
+    'MLS': 'https://www.whoscored.com/Regions/233/Tournaments/85/USA-Major-League-Soccer',
+    'Super Lig': 'https://www.whoscored.com/Regions/225/Tournaments/17/Turkey-Super-Lig',
+    'Jupiler Pro League': 'https://www.whoscored.com/Regions/22/Tournaments/18/Belgium-Jupiler-Pro-League',
+    'Bundesliga II': 'https://www.whoscored.com/Regions/81/Tournaments/6/Germany-Bundesliga-II',
+    'Champions League': 'https://www.whoscored.com/Regions/250/Tournaments/12/Europe-Champions-League',
+    'Europa League': 'https://www.whoscored.com/Regions/250/Tournaments/30/Europe-Europa-League',
+    'FA Cup': 'https://www.whoscored.com/Regions/252/Tournaments/29/England-League-Cup',
+    'League Cup': 'https://www.whoscored.com/Regions/252/Tournaments/29/England-League-Cup',
+    'World Cup': 'https://www.whoscored.com/Regions/247/Tournaments/36/International-FIFA-World-Cup',
+    'European Championship': 'https://www.whoscored.com/Regions/247/Tournaments/124/International-European-Championship',
+    'AFCON': 'https://www.whoscored.com/Regions/247/Tournaments/104/International-Africa-Cup-of-Nations'
+    # End of Edd Webster leagues
+}
+
+MATCH_ID_PATTERN = re.compile(r'/Matches/(\d+)/')
+
+# The match centre data is a JS object assigned in an inline script of the match page
+MATCH_ARGS_SCRIPT = 'return (window.require && require.config && require.config.params) ? require.config.params["args"] : null;'
+MATCH_ARGS_PATTERN = re.compile(r'require\.config\.params\["args"\]\s*=\s*(\{.*?\})\s*;?\s*</script>', re.DOTALL)
+MATCH_ARGS_KEYS_PATTERN = re.compile(r'([{,]\s*)(matchId|matchCentreData|matchCentreEventTypeJson|formationIdNameMappings)(\s*:)')
+
+
+def parse_match_data(html):
+    """
+    Extract the match centre data from the HTML of a match page.
+
+    Parameters:
+    - html (string): The page source.
+
+    Returns:
+    - dict: The match data, with the 'matchId' and 'matchCentreData' keys.
+    """
+    found = MATCH_ARGS_PATTERN.search(html)
+    if not found:
+        raise ValueError("No match data found in the page")
+    # Only the top level keys of the JS object are unquoted
+    return json.loads(MATCH_ARGS_KEYS_PATTERN.sub(r'\1"\2"\3', found.group(1)))
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def is_calendar_season(year, league):
+    """Returns True if the season of the league runs over a calendar year, instead of over two years"""
+    return (league=='Argentina Liga Profesional' and year in [2016,2021]) \
+        or league in ['Brasileirao','MLS','World Cup','European Championship','AFCON']
+
+
+def get_match_id(link):
+    """
+    Extract the WhoScored match id from a match link.
+
+    Parameters:
+    - link (string): The match link (ex: "https://www.whoscored.com/Matches/1821093/Live/...").
+
+    Returns:
+    - int: The match id, or None if the link has no id.
+    """
+    found = MATCH_ID_PATTERN.search(link)
+    return int(found.group(1)) if found else None
+
+
+def filter_match_links(match_links, skip_ids):
+    """
+    Remove the links of the matches that don't need to be scraped again.
+
+    Parameters:
+    - match_links (dict): The {link: match_data} dictionary.
+    - skip_ids (set): The match ids to skip.
+
+    Returns:
+    - dict: The {link: match_data} dictionary without the skipped matches.
+    """
+    if not skip_ids:
+        return match_links
+    kept_links = {link: data for link, data in match_links.items() if get_match_id(link) not in skip_ids}
+    logging.info("%s matches already processed, skipped", len(match_links) - len(kept_links))
+    return kept_links
 
 
 class WhoScored():
 
     ############################################################################
-    def __init__(self):
-        options = Options()
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('window-size=1920,1080')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-
-        self.display = Display(visible=0, size=(1920, 1080))
-        self.display.start()
-        
-        # proxy = get_proxy() # Use proxy
-        # options.add_argument('--proxy-server="http={};https={}"'.format(proxy, proxy))
-        prefs = {'profile.managed_default_content_settings.images': 2} # don't load images to make faster
-        options.add_experimental_option('prefs', prefs)
+    def __init__(self, wait_timeout=DEFAULT_WAIT_TIMEOUT, use_fixtures_feed=True, drivers=None):
+        self.wait_timeout = wait_timeout
+        self.use_fixtures_feed = use_fixtures_feed
+        self.fixtures = {}
+        # Without a shared manager, the scraper owns its driver and display
+        self.owns_drivers = drivers is None
+        self.drivers = drivers if drivers is not None else DriverManager()
+        self.start()
 
-        chrome_driver_path = '/usr/bin/chromedriver'
-        service = Service(chrome_driver_path)
-
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.53 Safari/537.36'})
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        
+    ############################################################################
+    def start(self):
+        """Takes a warm driver from the drivers manager, or starts one"""
+        self.driver = self.drivers.acquire()
+        self.pages_count = 0
+        # The cookie consent is given once per driver session
+        self.cookie_consent_handled = False
         logging.info("Initializing WhoScored scraper")
         # clear_output()
 
@@ -50,10 +139,41 @@ class WhoScored():
     ############################################################################
     def close(self):
         logging.info("Closing WhoScored scraper")
-        if hasattr(self, 'driver'):
-            self.driver.quit()
-        if hasattr(self, 'display'):
-            self.display.stop()
+        if getattr(self, 'driver', None) is not None:
+            if self.owns_drivers:
+                self.drivers.quit(self.driver)
+            else:
+                self.drivers.release(self.driver)
+            self.driver = None
+        if self.owns_drivers:
+            self.drivers.close()
+
+        
+    ############################################################################
+    def restart(self):
+        """Replaces the driver with a fresh one"""
+        logging.info("Restarting WhoScored scraper")
+        self.driver = self.drivers.restart(self.driver)
+        self.pages_count = 0
+        self.cookie_consent_handled = False
+
+        
+    ############################################################################
+    def recover(self):
+        """Brings the driver back to a blank page after an error, and restarts it only if it doesn't answer"""
+        if not self.drivers.recover(self.driver):
+            self.restart()
+
+        
+    ############################################################################
+    def get(self, url):
+        """Loads a page, recycling the driver first if it is worn"""
+        if self.drivers.should_recycle(self.driver, self.pages_count):
+            self.driver = self.drivers.recycle(self.driver)
+            self.pages_count = 0
+            self.cookie_consent_handled = False
+        self.pages_count += 1
+        self.driver.get(url)
 
         
     ############################################################################
@@ -63,51 +183,23 @@ class WhoScored():
         #    print(error)
         #    return -1
         
-        links = {
-            'EPL': 'https://www.whoscored.com/Regions/252/Tournaments/2/England-Premier-League',
-            'La Liga': 'https://www.whoscored.com/Regions/206/Tournaments/4/Spain-LaLiga',
-            'Bundesliga': 'https://www.whoscored.com/Regions/81/Tournaments/3/Germany-Bundesliga',
-            'Serie A': 'https://www.whoscored.com/Regions/108/Tournaments/5/Italy-Serie-A',
-            'Ligue 1': 'https://www.whoscored.com/Regions/74/Tournaments/22/France-Ligue-1',
-            'Argentina Liga Profesional': 'https://www.whoscored.com/Regions/11/Tournaments/68/Argentina-Liga-Profesional',
-            'EFL Championship': 'https://www.whoscored.com/Regions/252/Tournaments/7/England-Championship',
-            'EFL1': 'https://www.whoscored.com/Regions/252/Tournaments/8/England-League-One',
-            'EFL2': 'https://www.whoscored.com/Regions/252/Tournaments/9/England-League-Two',
-            # Edd Webster added these leagues (twitter: https://twitter.com/eddwebster)
-            'Liga Nos': 'https://www.whoscored.com/Regions/177/Tournaments/21/Portugal-Liga-NOS',
-            'Eredivisie': 'https://www.whoscored.com/Regions/155/Tournaments/13/Netherlands-Eredivisie',
-            'Russian Premier League': 'https://www.whoscored.com/Regions/182/Tournaments/77/Russia-Premier-League',
-            'Brasileirao': 'https://www.whoscored.com/Regions/31/Tournaments/95/Brazil-Brasileir%C3%A3o',
-            'MLS': 'https://www.whoscored.com/Regions/233/Tournaments/85/USA-Major-League-Soccer',
-            'Super Lig': 'https://www.whoscored.com/Regions/225/Tournaments/17/Turkey-Super-Lig',
-            'Jupiler Pro League': 'https://www.whoscored.com/Regions/22/Tournaments/18/Belgium-Jupiler-Pro-League',
-            'Bundesliga II': 'https://www.whoscored.com/Regions/81/Tournaments/6/Germany-Bundesliga-II',
-            'Champions League': 'https://www.whoscored.com/Regions/250/Tournaments/12/Europe-Champions-League',
-            'Europa League': 'https://www.whoscored.com/Regions/250/Tournaments/30/Europe-Europa-League',
-            'FA Cup': 'https://www.whoscored.com/Regions/252/Tournaments/29/England-League-Cup',
-            'League Cup': 'https://www.whoscored.com/Regions/252/Tournaments/29/England-League-Cup',
-            'World Cup': 'https://www.whoscored.com/Regions/247/Tournaments/36/International-FIFA-World-Cup',
-            'European Championship': 'https://www.whoscored.com/Regions/247/Tournaments/124/International-European-Championship',
-            'AFCON': 'https://www.whoscored.com/Regions/247/Tournaments/104/International-Africa-Cup-of-Nations'
-            # End of Edd Webster leagues
-        }
         
-        if (league=='Argentina Liga Profesional' and year in [2016,2021]) \
-                or league in ['Brasileirao','MLS','World Cup','European Championship','AFCON']:
+        if is_calendar_season(year, league):
             year_str = str(year)
         else:
             year_str = '{}/{}'.format(year-1, year)
         
-        # Repeatedly try to get the league's homepage
-        done = False
-        while not done:
+        # Try to get the league's homepage, waiting longer after each failure
+        for try_count in range(1, SEASON_LINK_MAX_TRIES + 1):
             try:
-                self.driver.get(links[league])
-                done = True
-            except:
-                self.close()
-                self.__init__()
-                time.sleep(5)
+                self.get(LEAGUE_LINKS[league])
+                break
+            except Exception as e:
+                logging.error("Error loading the %s page (Attempt %s): %s", league, try_count, e)
+                if try_count == SEASON_LINK_MAX_TRIES:
+                    return -1
+                time.sleep(backoff_delay(try_count))
+                self.recover()
         print('League page status: {}'.format(self.driver.execute_script('return document.readyState')))
         
         # Wait for season dropdown to be accessible, then find the link to the chosen season
@@ -118,10 +210,37 @@ class WhoScored():
                         return 'https://www.whoscored.com'+subel.get_attribute('value')
         return -1
 
+    def wait_for_page_ready(self, timeout=None):
+        """Waits until the document is loaded and no jQuery request is pending"""
+        WebDriverWait(self.driver, timeout or self.wait_timeout).until(
+            lambda driver: driver.execute_script(
+                'return document.readyState === "complete" && (!window.jQuery || jQuery.active === 0)'
+            )
+        )
+
+    def wait_for_week_change(self, previous_date, previous_match_element=None):
+        """
+        Waits until the fixtures of another week are displayed.
+
+        Parameters:
+        - previous_date (string): The toggleDatePicker text before the click.
+        - previous_match_element (WebElement): A fixture of the previous week, which is replaced.
+        """
+        def week_changed(driver):
+            date_elements = driver.find_elements(By.CLASS_NAME, "toggleDatePicker")
+            if not date_elements or date_elements[0].text == previous_date:
+                return False
+            return previous_match_element is None or EC.staleness_of(previous_match_element)(driver)
+
+        WebDriverWait(self.driver, self.wait_timeout).until(week_changed)
+        self.wait_for_page_ready()
+
     def handle_cookie_consent(self):
+        if self.cookie_consent_handled:
+            return True
         # self.save_html("before_cookie_consent.html")
         try:
-            WebDriverWait(self.driver, 20).until(
+            WebDriverWait(self.driver, 2 * self.wait_timeout).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
@@ -131,26 +250,28 @@ class WhoScored():
             )
             
             try:
-                agree_button = WebDriverWait(self.driver, 10).until(
+                agree_button = WebDriverWait(self.driver, self.wait_timeout).until(
                     EC.element_to_be_clickable((By.XPATH, agree_button_xpath))
                 )
                 self.driver.execute_script("arguments[0].click();", agree_button)
+                WebDriverWait(self.driver, self.wait_timeout).until(EC.staleness_of(agree_button))
                 print("Cookie consent handled successfully")
-                time.sleep(5)
                 # self.save_html("after_cookie_consent.html")
+                self.cookie_consent_handled = True
                 return True
             except Exception as e:
                 print(f"Error clicking AGREE button: {str(e)}")
                 
             try:
                 close_button_xpath = "//button[@aria-label='Close']"
-                close_button = WebDriverWait(self.driver, 5).until(
+                close_button = WebDriverWait(self.driver, self.wait_timeout / 2).until(
                     EC.element_to_be_clickable((By.XPATH, close_button_xpath))
                 )
                 self.driver.execute_script("arguments[0].click();", close_button)
+                WebDriverWait(self.driver, self.wait_timeout).until(EC.invisibility_of_element(close_button))
                 print("Closed cookie consent dialog")
-                time.sleep(2)
                 self.save_html("after_closing_consent_dialog.html")
+                self.cookie_consent_handled = True
                 return True
             except Exception as e:
                 print(f"Error closing consent dialog: {str(e)}")
@@ -173,23 +294,34 @@ class WhoScored():
             print(f"Error saving HTML content: {str(e)}")
 
     ############################################################################
-    def get_match_links(self, year, league):
-        logging.info(f"Getting match links for {league} {year}")
+    def get_match_links(self, year, league, skip_ids=None):
+        """
+        Get the links of the matches of a season.
+
+        With the fixtures feed, the status and kick-off time of the fixtures tell
+        which matches need to be scraped, see select_fixture_links.
+
+        Parameters:
+        - year (int): The season end year.
+        - league (string): The league name.
+        - skip_ids (set): The ids of the finished matches already processed.
+
+        Returns:
+        - dict: The {link: ''} dictionary of the matches, -1 if the season page isn't found.
+        """
+        logging.info("Getting match links for %s %s", league, year)
         # Go to season page
         season_link = self.get_season_link(year, league)
         if season_link == -1:
             print("Failed to get season link.")
             return -1
         
-        self.driver.get(season_link)
-        logging.info(f'Season page status: {self.driver.execute_script("return document.readyState")}')
+        self.get(season_link)
+        logging.info('Season page status: %s', self.driver.execute_script("return document.readyState"))
 
         if not self.handle_cookie_consent():
             logging.warning("Failed to handle cookie consent, continuing anyway...")
         
-        if not self.handle_cookie_consent():
-            print("Failed to handle cookie consent, continuing anyway...")
-        
         # Gather the links. Make this a set to avoid repeat match links.
         links = set()
         stage_elements = self.driver.find_elements(By.XPATH, '//*[@id="stages"]/option')
@@ -197,12 +329,27 @@ class WhoScored():
         if not stage_urls:
             stage_urls = [self.driver.current_url]
         
-        logging.info(f"Number of stages found: {len(stage_urls)}")
+        logging.info("Number of stages found: %s", len(stage_urls))
+
+        # The fixtures feed gives the whole season in one request per month, the weeks are only browsed without it
+        if self.use_fixtures_feed:
+            self.fixtures = discover_fixtures(
+                self.driver,
+                stage_urls,
+                year,
+                LEAGUE_LINKS[league].rstrip('/').split('/')[-1],
+                is_calendar_season(year, league),
+                timeout=self.wait_timeout
+            )
+            if self.fixtures:
+                return select_fixture_links(self.fixtures, skip_ids)
+            logging.warning("No match found in the fixtures feed, browsing the weeks instead")
         
         # Iterate through the stages
         for stage_url in stage_urls:
-            logging.info(f"Processing stage: {stage_url}")
-            self.driver.get(stage_url)
+            logging.info("Processing stage: %s", stage_url)
+            self.get(stage_url)
+            self.wait_for_page_ready()
 
             """
             # Go to the fixtures
@@ -225,38 +372,37 @@ class WhoScored():
 
             while attempts < max_attempts:
                 attempts += 1
-                time.sleep(2)  # Reduced wait time
 
-                logging.info(f"--- Attempt {attempts} ---")
+                logging.info("--- Attempt %s ---", attempts)
                 
                 try:
-                    date_element = WebDriverWait(self.driver, 5).until(
+                    date_element = WebDriverWait(self.driver, self.wait_timeout).until(
                         EC.presence_of_element_located((By.CLASS_NAME, "toggleDatePicker"))
                     )
                     new_date = date_element.text
                     if new_date != current_date:
-                        logging.info(f"Date changed: {new_date}")
+                        logging.info("Date changed: %s", new_date)
                         current_date = new_date
                     else:
                         logging.info("Date didn't change, page might not have updated")
                         if attempts > 1:
                             break
                 except Exception as e:
-                    logging.error(f"Error getting date: {str(e)}")
+                    logging.error("Error getting date: %s", e)
                 
                 match_elements = self.driver.find_elements(By.XPATH, "//a[contains(@class, 'Match-module_score')]")
                 new_links = set(el.get_attribute('href') for el in match_elements if el.get_attribute('href'))
                 links.update(new_links)
 
-                logging.info(f"New links found: {len(new_links)}")
-                logging.info(f"Total unique links: {len(links)}")
+                logging.info("New links found: %s", len(new_links))
+                logging.info("Total unique links: %s", len(links))
                 
                 if not new_links and attempts > 1:
                     logging.info("No new links found. Stopping.")
                     break
                 
                 try:
-                    prev_week_button = WebDriverWait(self.driver, 5).until(
+                    prev_week_button = WebDriverWait(self.driver, self.wait_timeout).until(
                         EC.element_to_be_clickable((By.ID, "dayChangeBtn-prev"))
                     )
                     
@@ -266,9 +412,12 @@ class WhoScored():
                     
                     logging.info("Clicking previous week button...")
                     self.driver.execute_script("arguments[0].click();", prev_week_button)
-                    time.sleep(3)  # Reduced wait time after click
+                    self.wait_for_week_change(current_date, match_elements[0] if match_elements else None)
+                except TimeoutException:
+                    logging.info("The previous week didn't load. Stopping.")
+                    break
                 except Exception as e:
-                    logging.error(f"Error with previous week button: {str(e)}")
+                    logging.error("Error with previous week button: %s", e)
                     break
 
         match_data_just_links = {link.replace("Show", "Live") if "Show" in link else link: '' for link in links}
@@ -276,7 +425,7 @@ class WhoScored():
         # save_filename = f'json_data/{league}_{year}_match_data.json'.replace(' ', '_')
         # with open(save_filename, 'w') as f:
         #     json.dump(match_data_just_links, f, indent=2)
-        # logging.info(f'Match links saved to {save_filename}')
+        # logging.info('Match links saved to %s', save_filename)
         
         return match_data_just_links
     
@@ -304,7 +453,7 @@ class WhoScored():
             get: () => undefined
         })
         """)
-        self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.53 Safari/537.36'})
+        self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": USER_AGENT})
         
     ############################################################################
     def scrape_matches(self, year, league):
@@ -313,7 +462,7 @@ class WhoScored():
         #    print(error)
         #    return -1
 
-        logging.info(f"Starting to scrape matches for {league} {year}")
+        logging.info("Starting to scrape matches for %s %s", league, year)
 
         # Read match links from file or get them with selenium
         # save_filename = f'json_data/{league}_{year}_match_data.json'.replace(' ', '_')
@@ -325,104 +474,141 @@ class WhoScored():
         if match_data == -1:
             return -1
             
-        logging.info(f"Total matches found for {league} {year}: {len(match_data)}")
+        logging.info("Total matches found for %s %s: %s", league, year, len(match_data))
         
-        for i, link in enumerate(match_data, 1):
-            if match_data[link] == '':
-                for try_count in range(1, 4):
-                    try:
-                        logging.info(f"Scraping match {i}/{len(match_data)} (Attempt {try_count})")
-                        match_data[link] = self.scrape_match(link)
-                        break
-                    except Exception as e:
-                        logging.error(f"Error scraping match: {str(e)}")
-                        if try_count == 3:
-                            logging.error(f'Failed to scrape match {i}/{len(match_data)} from {link}')
-                        else:
-                            self.close()
-                            self.__init__()
-                            time.sleep(2)
+        for link, data in self.iter_match_links(match_data):
+            match_data[link] = data
         
         # with open(save_filename, 'w') as f:
             # json.dump(match_data, f, indent=2)
-        # logging.info(f"Scraping completed. Data saved to {save_filename}")
+        # logging.info("Scraping completed. Data saved to %s", save_filename)
         return match_data
 
+    ############################################################################
+    def iter_matches(self, year, league, skip_ids=None):
+        """
+        Scrape the matches of a season one by one.
+
+        Parameters:
+        - year (int): The season end year.
+        - league (string): The league name.
+        - skip_ids (set): The ids of the matches not to scrape.
+
+        Yields:
+        - tuple: The (link, match_data) pair of each successfully scraped match.
+        """
+        logging.info("Starting to stream matches for %s %s", league, year)
+
+        match_links = self.get_match_links(year, league, skip_ids)
+        if match_links == -1:
+            logging.error("Failed to get match links for %s %s", league, year)
+            return
+
+        logging.info("Total matches found for %s %s: %s", league, year, len(match_links))
+        match_links = filter_match_links(match_links, skip_ids)
+
+        for link, data in self.iter_match_links(match_links):
+            if data != '':
+                yield link, data
+
+    ############################################################################
+    def iter_match_links(self, match_links):
+        """
+        Scrape the given match links one by one, retrying each link up to 3 times.
+
+        Parameters:
+        - match_links (dict): The {link: match_data} dictionary, links with '' are scraped.
+
+        Yields:
+        - tuple: The (link, match_data) pair, match_data is '' if every attempt failed.
+        """
+        for i, link in enumerate(match_links, 1):
+            if match_links[link] != '':
+                continue
+            logging.debug("Scraping match %d/%d", i, len(match_links))
+            yield link, self.scrape_match_with_retries(link)
+
+    ############################################################################
+    def scrape_match_with_retries(self, link, max_tries=3):
+        """
+        Scrape a match link, recovering the driver between failed attempts.
+
+        Parameters:
+        - link (string): The match centre link.
+        - max_tries (int): The maximum number of attempts.
+
+        Returns:
+        - dict: The match data, or '' if every attempt failed.
+        """
+        for try_count in range(1, max_tries + 1):
+            try:
+                logging.debug("Scraping %s (Attempt %d)", link, try_count)
+                return self.scrape_match(link)
+            except Exception as e:
+                logging.error("Error scraping match: %s", e)
+                metrics.count('retries')
+                if try_count == max_tries:
+                    logging.error('Failed to scrape match from %s', link)
+                else:
+                    self.recover()
+        return ''
+
     
     ############################################################################
     def scrape_match(self, link):
-        self.driver.get(link)
-        scripts = list()
-        
-        for el in self.driver.find_elements(By.TAG_NAME, 'script'):
-            scripts.append(el.get_attribute('innerHTML'))
-        
-        for script in scripts:
-            if 'require.config.params["args"]' in script:
-                match_data_string = script
-        
-        match_data_string = match_data_string.split(' = ')[1] \
-            .replace('matchId', '"matchId"') \
-            .replace('matchCentreData', '"matchCentreData"') \
-            .replace('matchCentreEventTypeJson', '"matchCentreEventTypeJson"') \
-            .replace('formationIdNameMappings', '"formationIdNameMappings"') \
-            .replace(';', '')
-        match_data = json.loads(match_data_string)
+        self.get(link)
+
+        # A single round-trip returning the JS object, the page source is parsed only as a fallback
+        try:
+            match_data = self.driver.execute_script(MATCH_ARGS_SCRIPT)
+        except WebDriverException as e:
+            logging.warning("Could not read the match data from the page scripts: %s", e)
+            match_data = None
+
+        if not match_data:
+            match_data = parse_match_data(self.driver.page_source)
         
         return match_data
     
     
     ################################################################################
+    @staticmethod
     def tabularize_match_data_events(match_data):
-    #-------------------------------------------------------------------------------
-        df = pd.DataFrame(columns=['id', 'eventId', 'minute', 'second', 'teamId', 'playerId',
-                                   'x', 'y', 'expandedMinute', 'periodValue', 'periodDisplayName',
-                                   'typeValue', 'typeDisplayName', 'outcomeTypeValue',
-                                   'outcomeTypeDisplayName', 'qualifiers', 'satisfiedEventTypes', 'isTouch'])
+        """
+        Tabularize the events of a match, in a single pass over the events.
+
+        Parameters:
+        - match_data (dict): The match data, as returned by scrape_match.
+
+        Returns:
+        - tuple: The (events_df, qualifiers_df) pair, qualifiers_df having one row
+          per qualifier, keyed by the event 'id'.
+        """
         events = match_data['matchCentreData']['events']
-        for event in events:
-            new_row = pd.Series(dtype=object)
-            new_row['id'] = int(event['id'])
-            try:
-                new_row['eventId'] = event['eventId']
-            except KeyError:
-                new_row['eventId'] = None
-            new_row['minute'] = event['minute']
-            try:
-                new_row['second'] = event['second']
-            except KeyError:
-                new_row['second'] = None
-            new_row['teamId'] = event['teamId']
-            try:
-                new_row['playerId'] = event['playerId']
-            except KeyError:
-                new_row['playerId'] = None
-            new_row['x'] = event['x']
-            new_row['y'] = event['y']
-            new_row['expandedMinute'] = event['expandedMinute']
-            new_row['periodValue'] = event['period']['value']
-            new_row['periodDisplayName'] = event['period']['displayName']
-            new_row['typeValue'] = event['type']['value']
-            new_row['typeDisplayName'] = event['type']['displayName']
-            new_row['outcomeTypeValue'] = event['outcomeType']['value']
-            new_row['outcomeTypeDisplayName'] = event['outcomeType']['displayName']
-            qualifiers = event['qualifiers']
-            if len(qualifiers) == 0:
-                new_row['qualifiers'] = None
-            else:
-                qualifiers_df = pd.DataFrame(columns=['typeValue', 'typeDisplayName', 'value'])
-                for qualifier in qualifiers:
-                    new_qualifier_row = pd.Series(dtype=object)
-                    new_qualifier_row['typeValue'] = qualifier['type']['value']
-                    new_qualifier_row['typeDisplayName'] = qualifier['type']['displayName']
-                    try:
-                        new_qualifier_row['value'] = qualifier['value']
-                    except KeyError:
-                        new_qualifier_row['value'] = None
-                    qualifiers_df = qualifiers_df.append(new_qualifier_row, ignore_index=True)
-                new_row['qualifiers'] = qualifiers_df
-            new_row['satisfiedEventTypes'] = event['satisfiedEventsTypes']
-            new_row['isTouch'] = event['isTouch']
-            df = df.append(new_row, ignore_index=True)
-        return df
-        
\ No newline at end of file
+        events_df = pd.DataFrame({
+            'id': np.fromiter((int(event['id']) for event in events), dtype=np.int64, count=len(events)),
+            'eventId': [event.get('eventId') for event in events],
+            'minute': [event['minute'] for event in events],
+            'second': [event.get('second') for event in events],
+            'teamId': [event['teamId'] for event in events],
+            'playerId': [event.get('playerId') for event in events],
+            'x': [event['x'] for event in events],
+            'y': [event['y'] for event in events],
+            'expandedMinute': [event['expandedMinute'] for event in events],
+            'periodValue': [event['period']['value'] for event in events],
+            'periodDisplayName': [event['period']['displayName'] for event in events],
+            'typeValue': [event['type']['value'] for event in events],
+            'typeDisplayName': [event['type']['displayName'] for event in events],
+            'outcomeTypeValue': [event['outcomeType']['value'] for event in events],
+            'outcomeTypeDisplayName': [event['outcomeType']['displayName'] for event in events],
+            'satisfiedEventTypes': [event['satisfiedEventsTypes'] for event in events],
+            'isTouch': [event['isTouch'] for event in events]
+        })
+
+        qualifiers_df = flatten_qualifiers([event['qualifiers'] for event in events], events_df['id'])
+        qualifiers_df = qualifiers_df.drop(columns='event_index').rename(columns={
+            'event_id': 'id',
+            'type_value': 'typeValue',
+            'type_name': 'typeDisplayName'
+        })
+        return events_df, qualifiers_df